@@ -0,0 +1,224 @@
+"""
+Offline end-to-end benchmark of the article pipeline
+
+Serves the saved article pages in benchmarks/corpus from a local HTTP server, so
+get_article_data_from downloads, parses, analyses and renders them unmodified without
+reaching any publisher. Each concurrency level runs every article through the pipeline
+from that many threads, and the benchmark reports end-to-end and per-stage latency,
+throughput, errors and peak memory for each level.
+
+Results can be saved as a baseline, and later runs compared against it to catch
+performance regressions.
+
+Usage:
+    python benchmarks/e2e.py [--concurrency 1 2 4] [--repeat 2] [--save-baseline | --baseline FILE]
+
+By default the result and sentence caches are turned off, so every run analyses every
+sentence. Pass --warm-caches to benchmark with them on.
+"""
+import argparse
+import functools
+import http.server
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCHMARKS_DIR, "corpus")
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "e2e_baseline.json")
+
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the corpus without logging every request"""
+    def log_message(self, *args):
+        pass
+
+def percentile(values, fraction):
+    """Return the value at a fraction (0 to 1) of the way through the sorted values"""
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def start_corpus_server(corpus_dir):
+    """
+    Serve a directory of article pages on a free local port
+
+    Returns:
+        Tuple of (server, base URL of the corpus)
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=corpus_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+def summarise_run(latencies, article_stats, seconds, errors):
+    """
+    Summarise the timings of one concurrency level
+
+    Args:
+        latencies: End-to-end seconds of each article
+        article_stats: Stats of each analysed article, see main.new_article_stats
+        seconds: Wall-clock seconds of the whole level
+        errors: Number of articles that failed
+
+    Returns:
+        Dictionary with the throughput, end-to-end and per-stage p50/p95 latency, error
+        count and peak memory so far
+    """
+    stages = {}
+    for stats in article_stats:
+        for stage, stage_seconds in stats["stages"].items():
+            stages.setdefault(stage, []).append(stage_seconds)
+
+    return {
+        "articles": len(latencies),
+        "errors": errors,
+        "articles_per_second": len(latencies) / seconds if seconds else None,
+        "latency_p50_seconds": percentile(latencies, 0.5),
+        "latency_p95_seconds": percentile(latencies, 0.95),
+        "stages": {
+            stage: {"p50_seconds": percentile(values, 0.5), "p95_seconds": percentile(values, 0.95)}
+            for stage, values in sorted(stages.items())
+        },
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def run_benchmark(concurrency_levels, repeat):
+    """
+    Run the corpus through get_article_data_from at each concurrency level
+
+    Args:
+        concurrency_levels: List of numbers of articles analysed at once
+        repeat: Number of times each article is analysed per level
+
+    Returns:
+        Report dictionary with the model load time and the results of each level
+    """
+    import main
+
+    # Collect the stats of every analysed article as the pipeline records them
+    article_stats = []
+    record_article_metrics = main.record_article_metrics
+    def capture_article_metrics(url, stats):
+        article_stats.append(stats)
+        record_article_metrics(url, stats)
+    main.record_article_metrics = capture_article_metrics
+
+    server, base_url = start_corpus_server(CORPUS_DIR)
+    urls = [base_url + name for name in sorted(os.listdir(CORPUS_DIR)) if name.endswith(".html")]
+
+    started = time.perf_counter()
+    main.initialize_nltk()
+    main.get_sentence_tokenizer()
+    main.load_models()
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "corpus": sorted(os.path.basename(url) for url in urls),
+        "load_seconds": time.perf_counter() - started,
+        "levels": {}
+    }
+
+    # Warm up once, so the first level doesn't pay for loading lazily imported code
+    main.get_article_data_from(urls[0])
+
+    for level in concurrency_levels:
+        article_stats.clear()
+
+        def analyse(url):
+            article_started = time.perf_counter()
+            output = main.get_article_data_from(url)
+            return time.perf_counter() - article_started, output.startswith("Error extracting article")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as executor:
+            results = list(executor.map(analyse, urls * repeat))
+        seconds = time.perf_counter() - started
+
+        latencies = [latency for latency, _ in results]
+        errors = sum(1 for _, failed in results if failed)
+        report["levels"][str(level)] = summarise_run(latencies, article_stats, seconds, errors)
+        print(f"Concurrency {level}: {json.dumps(report['levels'][str(level)], indent=2)}")
+
+    server.shutdown()
+    return report
+
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Compare a report with a baseline report
+
+    Args:
+        report: Report of this run
+        baseline: Earlier report to compare against
+        tolerance: Fraction a measurement can get worse by before it counts as a regression
+
+    Returns:
+        List of regression descriptions, empty if there are none
+    """
+    regressions = []
+    for level, results in report["levels"].items():
+        base = baseline["levels"].get(level)
+        if not base:
+            continue
+
+        # Higher latency, memory and error counts are worse, lower throughput is worse
+        checks = [
+            ("latency_p50_seconds", results["latency_p50_seconds"], base["latency_p50_seconds"], 1),
+            ("latency_p95_seconds", results["latency_p95_seconds"], base["latency_p95_seconds"], 1),
+            ("peak_rss_mb", results["peak_rss_mb"], base["peak_rss_mb"], 1),
+            ("articles_per_second", results["articles_per_second"], base["articles_per_second"], -1)
+        ]
+        for name, value, base_value, direction in checks:
+            if value is None or not base_value:
+                continue
+            change = (value - base_value) / base_value
+            print(f"Concurrency {level} {name}: {base_value:.3f} -> {value:.3f} ({change:+.1%})")
+            if change * direction > tolerance:
+                regressions.append(f"concurrency {level} {name} changed by {change:+.1%}")
+
+        if results["errors"] > base["errors"]:
+            regressions.append(f"concurrency {level} errors rose from {base['errors']} to {results['errors']}")
+
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the article pipeline end to end against a local copy of the corpus")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4], help="Numbers of articles analysed at once (default: 1 2 4)")
+    parser.add_argument("--repeat", type=int, default=2, help="Times each article is analysed per concurrency level (default: 2)")
+    parser.add_argument("--warm-caches", action="store_true", help="Keep the result and sentence caches on")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline report to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Save this run as the baseline instead of comparing against it")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Fraction a measurement can get worse by before it fails the comparison (default: 0.1)")
+    parser.add_argument("--output", help="Path to write this run's JSON report to")
+    args = parser.parse_args()
+
+    # The caches are configured from the environment when main.py is imported
+    if not args.warm_caches:
+        os.environ.update({"RESULT_CACHE_TTL": "0", "SENTENCE_CACHE_SIZE": "0", "SENTENCE_CACHE_PATH": "", "DOWNLOAD_CACHE_SIZE": "0", "DOWNLOAD_CACHE_PATH": ""})
+
+    report = run_benchmark(args.concurrency, args.repeat)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:\n" + "\n".join(f"- {regression}" for regression in regressions))
+            sys.exit(1)
+        print("No regressions against the baseline")
+    else:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
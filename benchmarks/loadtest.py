@@ -0,0 +1,183 @@
+"""
+Load test of the serving layer with stub models
+
+Starts the app under gunicorn with the stub models from stub_models.py, so the cost of
+each analysis is fixed and known, and serves the benchmark corpus from a local HTTP
+server. Then drives the /stream endpoint, which runs a whole article analysis in the
+request, from a rising number of concurrent clients. For each level it reports
+throughput, latency percentiles, time to the first event, error rate and queueing
+delay, measured as the latency of /readiness requests sent while the level runs.
+
+This shows how many concurrent analyses one instance can take for a given number of
+gunicorn workers and threads, and so how to size them and the App Engine instance class.
+
+Usage:
+    python benchmarks/loadtest.py [--workers 2] [--threads 4] [--concurrency 1 2 4 8 16] [--duration 20]
+
+The stub models' timing is set with STUB_NER_SECONDS, STUB_TSC_SECONDS and
+STUB_CPU_BOUND, see stub_models.py.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from e2e import BENCHMARKS_DIR, CORPUS_DIR, percentile, start_corpus_server
+
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+def start_app(port, workers, threads):
+    """
+    Start the app with stub models under gunicorn and wait until it is ready
+
+    Returns:
+        The gunicorn process
+    """
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_THREADS=str(threads),
+        # Every request should do the full analysis
+        RESULT_CACHE_TTL="0",
+        SENTENCE_CACHE_SIZE="0",
+        SENTENCE_CACHE_PATH="",
+        DOWNLOAD_CACHE_SIZE="0",
+        DOWNLOAD_CACHE_PATH=""
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(REPO_DIR, "gunicorn.conf.py"),
+         "--pythonpath", f"{REPO_DIR},{BENCHMARKS_DIR}", "stub_app:app"],
+        cwd=REPO_DIR, env=env
+    )
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/readiness", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+
+    process.terminate()
+    raise RuntimeError("gunicorn didn't become ready within 60 seconds")
+
+def run_level(app_url, article_urls, concurrency, duration):
+    """
+    Run one level of the load test: concurrency clients each analysing articles one
+    after another for duration seconds, while a probe measures queueing delay
+
+    Returns:
+        Dictionary with the level's request count, throughput, latency, time to first
+        event, queueing delay and error rate
+    """
+    results = []
+    probe_latencies = []
+    results_lock = threading.Lock()
+    article_cycle = itertools.cycle(article_urls)
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            with results_lock:
+                article_url = next(article_cycle)
+
+            started = time.perf_counter()
+            first_event = None
+            failed = False
+            try:
+                with session.get(f"{app_url}/stream", params={"url": article_url}, stream=True, timeout=300) as response:
+                    first_event = time.perf_counter() - started
+                    body = response.content
+                    failed = response.status_code != 200 or b"event: analysis-error" in body or b"event: done" not in body
+            except requests.RequestException:
+                failed = True
+
+            with results_lock:
+                results.append((time.perf_counter() - started, first_event, failed))
+
+    def probe():
+        # A cheap request waits behind the analyses for a free worker thread, so its
+        # latency is the time requests spend queueing
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                session.get(f"{app_url}/readiness", timeout=300)
+                probe_latencies.append(time.perf_counter() - started)
+            except requests.RequestException:
+                pass
+            time.sleep(0.25)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)] + [threading.Thread(target=probe)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    latencies = [latency for latency, _, _ in results]
+    first_events = [first_event for _, first_event, _ in results if first_event is not None]
+    errors = sum(1 for _, _, failed in results if failed)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": errors / len(results) if results else None,
+        "requests_per_second": len(results) / seconds if seconds else None,
+        "latency_p50_seconds": percentile(latencies, 0.5),
+        "latency_p95_seconds": percentile(latencies, 0.95),
+        "latency_p99_seconds": percentile(latencies, 0.99),
+        "first_event_p50_seconds": percentile(first_events, 0.5),
+        "first_event_p95_seconds": percentile(first_events, 0.95),
+        "queueing_delay_p50_seconds": percentile(probe_latencies, 0.5),
+        "queueing_delay_p95_seconds": percentile(probe_latencies, 0.95)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the app under gunicorn with stub models")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes (default: 2)")
+    parser.add_argument("--threads", type=int, default=4, help="Threads per gunicorn worker (default: 4)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Concurrent clients at each level (default: 1 2 4 8 16)")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds each level runs for (default: 20)")
+    parser.add_argument("--port", type=int, default=8089, help="Port to run the app on (default: 8089)")
+    parser.add_argument("--output", help="Path to write the JSON report to")
+    args = parser.parse_args()
+
+    corpus_server, corpus_url = start_corpus_server(CORPUS_DIR)
+    article_urls = [corpus_url + name for name in sorted(os.listdir(CORPUS_DIR)) if name.endswith(".html")]
+
+    app_process = start_app(args.port, args.workers, args.threads)
+    try:
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "workers": args.workers,
+            "threads": args.threads,
+            "stub_models": {name: os.environ.get(name) for name in ("STUB_NER_SECONDS", "STUB_TSC_SECONDS", "STUB_CPU_BOUND")},
+            "levels": []
+        }
+        for concurrency in args.concurrency:
+            level = run_level(f"http://127.0.0.1:{args.port}", article_urls, concurrency, args.duration)
+            report["levels"].append(level)
+            print(json.dumps(level, indent=2))
+    finally:
+        app_process.terminate()
+        app_process.wait()
+        corpus_server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote report to {args.output}")
@@ -0,0 +1,163 @@
+"""
+Generate the benchmark corpus of saved article pages in benchmarks/corpus
+
+The articles are made up from templates with a fixed random seed, so the corpus is the
+same every time it is generated. It covers articles of different lengths and the cases
+that are slow or easy to get wrong: very long sentences, blocks of all-caps links and
+pages dense with entities. Some pages embed schema.org NewsArticle data, so both
+extraction modes can be benchmarked.
+
+Usage:
+    python benchmarks/make_corpus.py
+"""
+import html
+import json
+import os
+import random
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+PEOPLE = [
+    "Alice Hartley", "Marcus Bell", "Priya Raman", "Tom Okafor", "Helen Strand", "David Mensah",
+    "Sofia Lindqvist", "James Carrow", "Fatima Idris", "Owen Price", "Grace Whitlock", "Daniel Osei",
+    "Laura Kincaid", "Rajesh Patel", "Emma Doyle", "Samuel Achebe", "Chloe Martin", "Victor Reyes"
+]
+ORGANISATIONS = [
+    "the Treasury", "the Home Office", "the Bank of England", "Northgate Energy", "the Met Office",
+    "Harbour Rail", "the Institute for Fiscal Studies", "Brightwell Pharmaceuticals", "the NHS",
+    "the European Commission", "Calder Steel", "the Football Association", "Ofcom", "Meridian Bank"
+]
+PLACES = [
+    "London", "Manchester", "Glasgow", "Cardiff", "Belfast", "Leeds", "Bristol", "Birmingham",
+    "Brussels", "Paris", "Berlin", "Dublin", "Edinburgh", "Liverpool", "Newcastle"
+]
+TOPICS = [
+    "the budget", "the new rail timetable", "energy prices", "hospital waiting lists", "the housing plan",
+    "interest rates", "the steel works", "the broadcasting review", "flood defences", "the trade talks"
+]
+
+SENTENCE_TEMPLATES = [
+    "{person} said {topic} would be reviewed by {org} before the end of the year.",
+    "Speaking in {place}, {person} warned that {topic} could cost far more than expected.",
+    "{org} confirmed on Tuesday that it had written to {person} about {topic}.",
+    "Critics in {place} argued that {topic} had been badly handled from the start.",
+    "{person}, who has led {org} since 2019, described the figures as encouraging.",
+    "A spokesperson for {org} declined to comment on {topic}.",
+    "Residents of {place} have been waiting months for a decision on {topic}.",
+    "{person} and {person2} are expected to meet in {place} next week.",
+    "The report from {org} found that {topic} had improved in most regions.",
+    "{person} told reporters that {org} had not been consulted.",
+    "Figures published by {org} suggest that {topic} will dominate the coming months.",
+    "It is not yet clear whether {topic} will go ahead as planned.",
+    "Officials said the changes were necessary, although many remain unconvinced.",
+    "The announcement was welcomed by business groups but criticised by unions.",
+    "{person2} said the decision was a serious mistake and called for an inquiry.",
+    "Earlier this year {org} faced questions in {place} over its handling of {topic}."
+]
+
+CAPS_LINKS = [
+    "READ MORE: TEN THINGS YOU NEED TO KNOW ABOUT THE BUDGET",
+    "SIGN UP FOR OUR FREE DAILY NEWSLETTER",
+    "FOLLOW US ON SOCIAL MEDIA FOR THE LATEST UPDATES",
+    "WATCH: THE MOMENT THE ANNOUNCEMENT WAS MADE",
+    "MORE ON THIS STORY",
+    "SHARE THIS ARTICLE WITH YOUR FRIENDS"
+]
+
+def make_sentence(rng):
+    """Fill a random sentence template with random entities"""
+    person, person2 = rng.sample(PEOPLE, 2)
+    sentence = rng.choice(SENTENCE_TEMPLATES).format(
+        person=person, person2=person2, org=rng.choice(ORGANISATIONS), place=rng.choice(PLACES), topic=rng.choice(TOPICS)
+    )
+    return sentence[0].upper() + sentence[1:]
+
+def make_paragraphs(rng, sentence_count, sentences_per_paragraph=4):
+    """Make paragraphs of template sentences"""
+    sentences = [make_sentence(rng) for _ in range(sentence_count)]
+    return [" ".join(sentences[i:i + sentences_per_paragraph]) for i in range(0, len(sentences), sentences_per_paragraph)]
+
+def make_long_sentence(rng, clauses):
+    """Make one sentence long enough to be split into several NER phrases"""
+    parts = []
+    for _ in range(clauses):
+        parts.append(f"{rng.choice(PEOPLE)} of {rng.choice(ORGANISATIONS)} in {rng.choice(PLACES)}, who spoke about {rng.choice(TOPICS)}")
+    return "The meeting was attended by " + ", ".join(parts) + ", and several others who asked not to be named."
+
+def make_entity_dense_paragraphs(rng, paragraph_count):
+    """Make paragraphs that name several entities in every sentence, like a results round-up"""
+    paragraphs = []
+    for _ in range(paragraph_count):
+        sentences = []
+        for _ in range(5):
+            first, second, third = rng.sample(PEOPLE, 3)
+            sentences.append(
+                f"{first} beat {second} in {rng.choice(PLACES)}, while {third} of {rng.choice(ORGANISATIONS)} "
+                f"finished ahead of {rng.choice(PEOPLE)} in {rng.choice(PLACES)}."
+            )
+        paragraphs.append(" ".join(sentences))
+    return paragraphs
+
+def render_page(title, author, date, paragraphs, structured):
+    """Render an article page, optionally with schema.org NewsArticle data"""
+    json_ld = ""
+    if structured:
+        json_ld = '<script type="application/ld+json">' + json.dumps({
+            "@context": "https://schema.org",
+            "@type": "NewsArticle",
+            "headline": title,
+            "articleBody": "\n\n".join(paragraphs),
+            "author": {"@type": "Person", "name": author},
+            "datePublished": f"{date}T09:00:00Z"
+        }) + "</script>"
+
+    body = "\n".join(f"<p>{html.escape(paragraph)}</p>" for paragraph in paragraphs)
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<meta name="author" content="{html.escape(author)}">
+<meta property="article:published_time" content="{date}T09:00:00Z">
+{json_ld}
+</head>
+<body>
+<article>
+<h1>{html.escape(title)}</h1>
+<p class="byline">By {html.escape(author)}</p>
+{body}
+</article>
+</body>
+</html>
+"""
+
+def main():
+    rng = random.Random(2024)
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+
+    articles = {
+        "short_news": ("Council Approves New Flood Defences", make_paragraphs(rng, 12), True),
+        "medium_politics": ("Treasury Faces Questions Over Budget Plans", make_paragraphs(rng, 45), False),
+        "long_feature": ("A Year Of Change In Britain's Cities", make_paragraphs(rng, 220, 5), True),
+        "long_sentences": (
+            "Inquiry Hears From Dozens Of Witnesses",
+            make_paragraphs(rng, 6) + [make_long_sentence(rng, 60), make_long_sentence(rng, 120)] + make_paragraphs(rng, 6),
+            False
+        ),
+        "caps_links": (
+            "Energy Prices Set To Rise Again",
+            [part for paragraph in make_paragraphs(rng, 30) for part in (paragraph, rng.choice(CAPS_LINKS))],
+            False
+        ),
+        "entity_dense": ("Weekend Results Round-Up", make_entity_dense_paragraphs(rng, 12), True)
+    }
+
+    for name, (title, paragraphs, structured) in articles.items():
+        author = rng.choice(PEOPLE)
+        date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        with open(os.path.join(CORPUS_DIR, f"{name}.html"), "w", encoding="utf-8") as f:
+            f.write(render_page(title, author, date, paragraphs, structured))
+        print(f"Wrote {name}.html")
+
+if __name__ == "__main__":
+    main()
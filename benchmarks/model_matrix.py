@@ -0,0 +1,228 @@
+"""
+Accuracy vs speed benchmark of the NER and sentiment configurations
+
+Runs a corpus of saved article pages through analyse_sentiment_newssentiment under each
+configuration in a matrix (NER checkpoint, backend, and NER and sentiment batch sizes), and reports the
+throughput, per-article latency and peak memory of each, along with how closely its
+entities and sentiments agree with a golden output.
+
+Each configuration runs in its own process, since the configuration is read from the
+environment when main.py is imported, and so its peak memory is measured on its own.
+
+Usage:
+    python benchmarks/model_matrix.py [CORPUS_DIR] [--matrix MATRIX.json] [--golden GOLDEN.json] [--output REPORT.json]
+
+The golden output is written from the first configuration of the matrix the first time
+the benchmark runs, and every later run is compared against it.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# e2e puts the repository on the path, so main can be imported after it
+from e2e import BENCHMARKS_DIR, CORPUS_DIR, percentile
+
+import main
+
+# Configurations benchmarked when no matrix file is given. The first one is the current
+# production setup and is used to write the golden output
+DEFAULT_MATRIX = [
+    {"name": "bert-large fp32 batch 8", "env": {"NER_MODEL_NAME": "dslim/bert-large-NER", "NER_BACKEND": "torch", "NER_BATCH_SIZE": "8"}},
+    {"name": "bert-large fp32 batch 1", "env": {"NER_MODEL_NAME": "dslim/bert-large-NER", "NER_BACKEND": "torch", "NER_BATCH_SIZE": "1"}},
+    {"name": "bert-large fp32 batch 16", "env": {"NER_MODEL_NAME": "dslim/bert-large-NER", "NER_BACKEND": "torch", "NER_BATCH_SIZE": "16"}},
+    {"name": "bert-large fp32 batch 8 tsc batch 4", "env": {"NER_MODEL_NAME": "dslim/bert-large-NER", "NER_BACKEND": "torch", "NER_BATCH_SIZE": "8", "TSC_BATCH_SIZE": "4"}},
+    {"name": "bert-large fp32 batch 8 tsc batch 32", "env": {"NER_MODEL_NAME": "dslim/bert-large-NER", "NER_BACKEND": "torch", "NER_BATCH_SIZE": "8", "TSC_BATCH_SIZE": "32"}},
+    {"name": "bert-large fp32 batch 8 tsc batch 64", "env": {"NER_MODEL_NAME": "dslim/bert-large-NER", "NER_BACKEND": "torch", "NER_BATCH_SIZE": "8", "TSC_BATCH_SIZE": "64"}},
+    {"name": "bert-large int8 batch 8", "env": {"NER_MODEL_NAME": "dslim/bert-large-NER", "NER_BACKEND": "quantized", "NER_BATCH_SIZE": "8"}},
+    {"name": "bert-large onnx batch 8", "env": {"NER_MODEL_NAME": "dslim/bert-large-NER", "NER_BACKEND": "onnx", "NER_BATCH_SIZE": "8"}},
+    {"name": "bert-base fp32 batch 8", "env": {"NER_MODEL_NAME": "dslim/bert-base-NER", "NER_BACKEND": "torch", "NER_BATCH_SIZE": "8"}},
+    {"name": "bert-base int8 batch 8", "env": {"NER_MODEL_NAME": "dslim/bert-base-NER", "NER_BACKEND": "quantized", "NER_BATCH_SIZE": "8"}},
+    {"name": "distilbert fp32 batch 8", "env": {"NER_MODEL_NAME": "dslim/distilbert-NER", "NER_BACKEND": "torch", "NER_BATCH_SIZE": "8"}}
+]
+
+def load_corpus(corpus_dir):
+    """
+    Extract the text of every saved article page in a directory
+
+    Args:
+        corpus_dir: Directory of saved HTML pages
+
+    Returns:
+        List of (article id, article text) tuples
+    """
+    articles = []
+    for item_id, _, path in main.read_bulk_inputs(corpus_dir):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            article, _ = main.fetch_article(f"file://{os.path.abspath(path)}", input_html=f.read())
+        articles.append((item_id, article.text))
+    return articles
+
+def run_configuration(corpus_dir, result_path):
+    """
+    Benchmark the configuration this process was started with, and write its timings,
+    peak memory and entities to a JSON file
+
+    Args:
+        corpus_dir: Directory of saved HTML pages
+        result_path: Path to write the results to
+    """
+    main.initialize_nltk()
+    articles = load_corpus(corpus_dir)
+
+    started = time.perf_counter()
+    main.load_models()
+    load_seconds = time.perf_counter() - started
+
+    # Warm up on the first article, the sentence cache is disabled so it is analysed again below
+    if articles:
+        main.analyse_sentiment_newssentiment(articles[0][1], {})
+
+    latencies = []
+    sentence_count = 0
+    entities = {}
+    started = time.perf_counter()
+    for item_id, text in articles:
+        sentence_results = {}
+        article_started = time.perf_counter()
+        main.analyse_sentiment_newssentiment(text, sentence_results)
+        latencies.append(time.perf_counter() - article_started)
+
+        sentence_count += len(sentence_results)
+        entities[item_id] = [
+            {"sentence": sentence, "start": mention["start"], "end": mention["end"],
+             "type": mention["entity_type"], "sentiment": mention["sentiment"]}
+            for sentence, mentions in sentence_results.items() for mention in mentions
+        ]
+    total_seconds = time.perf_counter() - started
+
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "load_seconds": load_seconds,
+            "total_seconds": total_seconds,
+            "articles": len(articles),
+            "sentences": sentence_count,
+            "latencies": latencies,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "entities": entities
+        }, f)
+
+def compare_to_golden(entities, golden):
+    """
+    Compare the entities found by a configuration with the golden output
+
+    Args:
+        entities: Dictionary mapping article ids to lists of entity mentions
+        golden: Golden entities, in the same form
+
+    Returns:
+        Dictionary with the entity span precision, recall and F1 (a span matches if its
+        sentence, position and type are the same), and the fraction of matching spans
+        whose sentiment label is the same
+    """
+    def spans(article_entities):
+        return {
+            (item_id, mention["sentence"], mention["start"], mention["end"], mention["type"]): mention["sentiment"]
+            for item_id, mentions in article_entities.items() for mention in mentions
+        }
+
+    found, expected = spans(entities), spans(golden)
+    matched = found.keys() & expected.keys()
+
+    precision = len(matched) / len(found) if found else 1.0
+    recall = len(matched) / len(expected) if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    agreement = sum(1 for span in matched if found[span] == expected[span]) / len(matched) if matched else None
+
+    return {"span_precision": precision, "span_recall": recall, "span_f1": f1, "sentiment_agreement": agreement}
+
+def run_matrix(corpus_dir, matrix, golden_path, output_path):
+    """
+    Benchmark every configuration of a matrix in its own process and write the report
+
+    Args:
+        corpus_dir: Directory of saved HTML pages
+        matrix: List of configurations, each with a name and the environment variables that set it up
+        golden_path: Path of the golden output, written from the first configuration if it doesn't exist
+        output_path: Path to write the JSON report to
+    """
+    golden = None
+    if os.path.exists(golden_path):
+        with open(golden_path, encoding="utf-8") as f:
+            golden = json.load(f)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "corpus": os.path.abspath(corpus_dir),
+        "golden": os.path.abspath(golden_path),
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "configurations": []
+    }
+
+    for configuration in matrix:
+        print(f"Benchmarking {configuration['name']}")
+
+        # Turn off the sentence cache so every configuration runs the models on every sentence
+        env = dict(os.environ, SENTENCE_CACHE_SIZE="0", SENTENCE_CACHE_PATH="", **configuration["env"])
+        with tempfile.TemporaryDirectory() as tmp:
+            result_path = os.path.join(tmp, "result.json")
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), corpus_dir, "--worker", result_path], env=env
+            )
+            if process.returncode != 0:
+                print(f"{configuration['name']} failed with exit code {process.returncode}")
+                report["configurations"].append({"name": configuration["name"], "env": configuration["env"], "error": process.returncode})
+                continue
+
+            with open(result_path, encoding="utf-8") as f:
+                result = json.load(f)
+
+        # The first configuration to run defines the golden output
+        if golden is None:
+            golden = result["entities"]
+            with open(golden_path, "w", encoding="utf-8") as f:
+                json.dump(golden, f)
+            print(f"Wrote golden output to {golden_path}")
+
+        latencies = result["latencies"]
+        summary = {
+            "name": configuration["name"],
+            "env": configuration["env"],
+            "load_seconds": result["load_seconds"],
+            "articles_per_second": result["articles"] / result["total_seconds"] if result["total_seconds"] else None,
+            "sentences_per_second": result["sentences"] / result["total_seconds"] if result["total_seconds"] else None,
+            "latency_p50_seconds": percentile(latencies, 0.5),
+            "latency_p95_seconds": percentile(latencies, 0.95),
+            "peak_rss_mb": result["peak_rss_mb"],
+            **compare_to_golden(result["entities"], golden)
+        }
+        report["configurations"].append(summary)
+        print(json.dumps(summary, indent=2))
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote report to {output_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark accuracy and speed across NER and sentiment configurations")
+    parser.add_argument("corpus", nargs="?", default=CORPUS_DIR, help="Directory of saved article HTML pages (default: benchmarks/corpus)")
+    parser.add_argument("--matrix", help="JSON file with a list of configurations, each with a name and env (default: built-in matrix)")
+    parser.add_argument("--golden", default=os.path.join(BENCHMARKS_DIR, "golden_entities.json"), help="Golden output to compare against, written by the first configuration if missing (default: benchmarks/golden_entities.json)")
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, "model_matrix_report.json"), help="Path to write the JSON report to (default: benchmarks/model_matrix_report.json)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_configuration(args.corpus, args.worker)
+    else:
+        matrix = DEFAULT_MATRIX
+        if args.matrix:
+            with open(args.matrix, encoding="utf-8") as f:
+                matrix = json.load(f)
+        run_matrix(args.corpus, matrix, args.golden, args.output)
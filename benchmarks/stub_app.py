@@ -0,0 +1,11 @@
+"""
+The web app with stub models, for load testing under gunicorn (see loadtest.py)
+
+    gunicorn -c gunicorn.conf.py --pythonpath .,benchmarks stub_app:app
+"""
+import main
+from stub_models import install_stub_models
+
+install_stub_models(main)
+
+app = main.app
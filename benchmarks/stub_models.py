@@ -0,0 +1,87 @@
+"""
+Deterministic stand-ins for the NER pipeline and target sentiment classifier
+
+They take a configurable time per input and give the same entities and sentiments for
+the same text every time, so the serving layer can be load tested without the cost of
+the real models.
+
+    STUB_NER_SECONDS  Seconds of NER work per sentence or phrase (default 0.02)
+    STUB_TSC_SECONDS  Seconds of sentiment work per entity mention (default 0.005)
+    STUB_CPU_BOUND    1 (default) to spend the time computing and hold the CPU like the
+                      real models, 0 to sleep and leave it free
+"""
+import os
+import re
+import time
+import zlib
+
+STUB_NER_SECONDS = float(os.environ.get("STUB_NER_SECONDS", "0.02"))
+STUB_TSC_SECONDS = float(os.environ.get("STUB_TSC_SECONDS", "0.005"))
+STUB_CPU_BOUND = os.environ.get("STUB_CPU_BOUND", "1") == "1"
+
+# Runs of capitalised words are treated as entities
+ENTITY_PATTERN = re.compile(r"\b[A-Z][a-z]+(?: [A-Z][a-z]+)*")
+
+# Words and punctuation, roughly how BERT splits text into tokens
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+ENTITY_GROUPS = ["PER", "ORG", "LOC", "MISC"]
+SENTIMENTS = ["positive", "neutral", "negative"]
+
+def spend(seconds):
+    """Take up a number of seconds, computing or sleeping depending on STUB_CPU_BOUND"""
+    if seconds <= 0:
+        return
+    if not STUB_CPU_BOUND:
+        time.sleep(seconds)
+        return
+
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+class StubTokenizer:
+    """Gives the token offsets of text, like a fast tokenizer called with return_offsets_mapping"""
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=True):
+        return {"offset_mapping": [[match.span() for match in TOKEN_PATTERN.finditer(text)] for text in texts]}
+
+class StubNER:
+    """Finds capitalised words as entities, in the format of the aggregated NER pipeline"""
+    def __init__(self):
+        self.tokenizer = StubTokenizer()
+
+    def find_entities(self, text):
+        spend(STUB_NER_SECONDS)
+        return [
+            {
+                "entity_group": ENTITY_GROUPS[zlib.crc32(match.group().encode()) % len(ENTITY_GROUPS)],
+                "word": match.group(),
+                "score": 0.99,
+                "start": match.start(),
+                "end": match.end()
+            }
+            for match in ENTITY_PATTERN.finditer(text)
+        ]
+
+    def __call__(self, inputs, batch_size=None):
+        if isinstance(inputs, list):
+            return [self.find_entities(text) for text in inputs]
+        return self.find_entities(inputs)
+
+class StubTargetSentimentClassifier:
+    """Picks a sentiment from the target and its context, in the format of NewsSentiment"""
+    def classify(self, left_context, target, right_context):
+        spend(STUB_TSC_SECONDS)
+        label = SENTIMENTS[zlib.crc32(f"{left_context}|{target}|{right_context}".encode()) % len(SENTIMENTS)]
+        return ({"class_label": label, "class_prob": 0.9},)
+
+    def infer(self, targets, batch_size=None, disable_tqdm=True):
+        return [self.classify(*target) for target in targets]
+
+    def infer_from_text(self, left_context, target, right_context):
+        return self.classify(left_context, target, right_context)
+
+def install_stub_models(main):
+    """Put the stub models in main.py's model registry, so the real ones are never loaded"""
+    main._model_registry["ner"] = StubNER()
+    main._model_registry["tsc"] = StubTargetSentimentClassifier()
@@ -0,0 +1,41 @@
+# Gunicorn settings, read automatically when gunicorn starts in this directory
+import os
+import shutil
+import tempfile
+
+bind = f":{os.environ.get('PORT', '8080')}"
+
+# Worker processes, and threads per worker for the page, polling and streaming requests
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+# Each worker keeps its own jobs and analysed articles, so with more than one worker they
+# are shared through SQLite files for this server run (see JOB_STORE_PATH and
+# RESULT_CACHE_PATH in main.py), otherwise polling a job would fail whenever the request
+# reached a different worker. The files are removed when the server exits
+shared_dir = None
+if workers > 1:
+    shared_dir = tempfile.mkdtemp(prefix="gunicorn-shared-")
+    os.environ.setdefault("JOB_STORE_PATH", os.path.join(shared_dir, "jobs.sqlite3"))
+    os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(shared_dir, "results.sqlite3"))
+
+# Load the app and its models once in the master before forking, so the workers share
+# the model weights copy-on-write instead of each holding their own copy. Set
+# PRELOAD_MODELS=0 to have each worker load its own models instead
+preload_app = os.environ.get("PRELOAD_MODELS", "1") == "1"
+
+# The tokenizers library can't use its thread pool safely in forked workers
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+def when_ready(server):
+    """Load the models in the master, after the app is imported and before the workers are forked"""
+    if preload_app:
+        import main
+        main.prepare_models_for_workers()
+        server.log.info("Models loaded in the master, workers will share them")
+
+def on_exit(server):
+    """Remove the jobs and results shared by this run's workers"""
+    if shared_dir:
+        shutil.rmtree(shared_dir, ignore_errors=True)
@@ -1,29 +1,671 @@
-from flask import Flask, request
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+from flask import Flask, request, jsonify, Response, stream_with_context, url_for, render_template
 import os
-import nltk
-import newspaper
-import tldextract
-from NewsSentiment import TargetSentimentClassifier
-from nltk.tokenize import sent_tokenize
+import requests
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
 import re
 import html
+import threading
+import socket
+import queue
+import hashlib
+import gzip
+import json
+import sqlite3
+import unicodedata
+import time
+import uuid
+import gc
+import importlib
+import argparse
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
 app = Flask(__name__)
 
+# Leave out the newlines and indentation of template tags, so the templates can be laid
+# out readably without padding every page
+app.jinja_env.trim_blocks = True
+app.jinja_env.lstrip_blocks = True
+
+# Hugging Face checkpoint used for named entity recognition
+NER_MODEL_NAME = os.environ.get("NER_MODEL_NAME", "dslim/bert-large-NER")
+
+# How the NER model is run: "torch" runs it as loaded, "quantized" converts its linear
+# layers to int8 with torch dynamic quantization, and "onnx" runs an ONNX export of it
+# with ONNX Runtime (needs optimum[onnxruntime])
+NER_BACKEND = os.environ.get("NER_BACKEND", "torch")
+
+# Directory the ONNX export of the NER model is saved in, so it is only exported once
+NER_ONNX_DIR = os.environ.get("NER_ONNX_DIR", os.path.join(os.path.dirname(__file__), "onnx_models"))
+
+# Maximum number of tokens in one NER input, leaving room for the [CLS] and [SEP] tokens
+MAX_NER_TOKENS = 510
+
+# Number of tokens shared by consecutive phrases when a long sentence is split, 0 for no overlap
+NER_WINDOW_STRIDE = int(os.environ.get("NER_WINDOW_STRIDE", "0"))
+
+# How chunks are sent to the NER model: "sentence" runs each sentence on its own, "packed"
+# packs consecutive sentences into windows of up to MAX_NER_TOKENS tokens, and "compare"
+# uses per-sentence results but prints where packing would have found different entities
+NER_PACKING = os.environ.get("NER_PACKING", "sentence")
+
+# Number of sentences analysed and rendered together before progress is reported or streamed
+ANALYSIS_GROUP_SIZE = max(1, int(os.environ.get("ANALYSIS_GROUP_SIZE", "32")))
+
+# Number of sentences or phrases sent through the NER model in one forward pass
+NER_BATCH_SIZE = int(os.environ.get("NER_BATCH_SIZE", "8"))
+
+# Number of entity mentions classified by the target sentiment classifier in one batch
+TSC_BATCH_SIZE = int(os.environ.get("TSC_BATCH_SIZE", "16"))
+
+# Name of the NewsSentiment model used by TargetSentimentClassifier (its default model)
+TSC_MODEL_NAME = "grutsc"
+
+# Maximum number of sentences kept in the in-memory inference cache, 0 disables it
+SENTENCE_CACHE_SIZE = int(os.environ.get("SENTENCE_CACHE_SIZE", "20000"))
+
+# Optional SQLite file that keeps cached sentence results across restarts
+SENTENCE_CACHE_PATH = os.environ.get("SENTENCE_CACHE_PATH", "")
+
+# Seconds an analysed article is kept in the result cache, 0 disables it
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", "900"))
+
+# Maximum number of analysed articles kept in the result cache
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+
+# Optional SQLite file that shares analysed articles between gunicorn workers, see gunicorn.conf.py
+RESULT_CACHE_PATH = os.environ.get("RESULT_CACHE_PATH", "")
+
+# Query parameters that only track where a link was shared or select the AMP
+# version of a page, neither of which changes the article
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid", "ocid", "cmpid",
+    "ref", "ref_src", "at_medium", "at_campaign", "at_custom1", "at_custom2", "at_custom3",
+    "at_custom4", "xtor", "CMP", "ito", "_ga", "amp", "outputType"
+}
+
+# Words with 2+ chars, used to find all-caps sentences
+WORD_PATTERN = re.compile(r'\w{2,}')
+
+# Number of worker threads running analysis jobs
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+
+# Maximum number of analysis jobs waiting or running before new ones are rejected
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", "32"))
+
+# Seconds a finished job's result can still be fetched
+JOB_TTL = int(os.environ.get("JOB_TTL", "600"))
+
+# Optional SQLite file that shares job state between gunicorn workers, so polling /jobs/<id>
+# works whichever worker the request lands on, see gunicorn.conf.py
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "")
+
+# Seconds between keep-alive comments on a stream that is waiting for its analysis
+STREAM_KEEPALIVE_SECONDS = float(os.environ.get("STREAM_KEEPALIVE_SECONDS", "15"))
+
+# Number of threads downloading articles for a batch analysis
+BATCH_DOWNLOAD_WORKERS = int(os.environ.get("BATCH_DOWNLOAD_WORKERS", "8"))
+
+# Maximum number of articles in one batch analysis request
+BATCH_MAX_URLS = int(os.environ.get("BATCH_MAX_URLS", "30"))
+
+# Seconds to wait for a publisher to accept a connection, and between bytes of its response
+DOWNLOAD_CONNECT_TIMEOUT = float(os.environ.get("DOWNLOAD_CONNECT_TIMEOUT", "5"))
+DOWNLOAD_READ_TIMEOUT = float(os.environ.get("DOWNLOAD_READ_TIMEOUT", "15"))
+
+# Most seconds a whole page download may take, so a publisher trickling bytes can't hold a worker
+DOWNLOAD_TOTAL_TIMEOUT = float(os.environ.get("DOWNLOAD_TOTAL_TIMEOUT", "30"))
+
+# Largest article page downloaded, in bytes
+DOWNLOAD_MAX_BYTES = int(os.environ.get("DOWNLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# Maximum number of downloaded pages kept in memory for conditional requests, 0 disables it
+DOWNLOAD_CACHE_SIZE = int(os.environ.get("DOWNLOAD_CACHE_SIZE", "64"))
+
+# Optional SQLite file that keeps downloaded pages across restarts
+DOWNLOAD_CACHE_PATH = os.environ.get("DOWNLOAD_CACHE_PATH", "")
+
+# Maximum number of publishers' keep-alive sessions kept open, the least recently used is closed
+DOWNLOAD_SESSIONS = int(os.environ.get("DOWNLOAD_SESSIONS", "32"))
+
+# How articles are extracted: "full" runs newspaper's parser on every page, "fast" takes the
+# text, title, authors and publish date from the page's schema.org NewsArticle data when it
+# has it, and only falls back to newspaper's parser when it doesn't
+EXTRACTION_MODE = os.environ.get("EXTRACTION_MODE", "full")
+
+# schema.org types whose JSON-LD data is used by the fast extraction mode
+STRUCTURED_ARTICLE_TYPES = {
+    "NewsArticle", "Article", "ReportageNewsArticle", "AnalysisNewsArticle",
+    "OpinionNewsArticle", "BackgroundNewsArticle", "ReviewNewsArticle"
+}
+
+# The NLP libraries (transformers, NewsSentiment, newspaper, nltk, lxml and tldextract) are
+# imported in the functions that first need them, so starting the app and serving the form
+# page doesn't wait for torch to load
+
+# Libraries timed by profile_startup, in the order they are imported. torch comes first
+# so its time isn't counted against the libraries that import it
+STARTUP_MODULES = ["torch", "transformers", "NewsSentiment", "newspaper", "nltk", "lxml.html", "tldextract"]
+
+# Optional local copy of the public suffix list for tldextract. If it isn't set, the
+# snapshot bundled with tldextract is used, so the list is never fetched over the network
+TLDEXTRACT_SUFFIX_LIST = os.environ.get("TLDEXTRACT_SUFFIX_LIST", "")
+
+# Print a JSON log line with the stage timings and counts of every analysed article
+METRICS_LOG = os.environ.get("METRICS_LOG", "0") == "1"
+
+# Histogram buckets for stage latencies in seconds, and for per-article counts
+STAGE_SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+ARTICLE_COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Seconds browsers can cache the static CSS and JS for. Their URLs change whenever
+# their contents do (see get_static_url), so they can be cached for a long time
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", str(365 * 24 * 60 * 60)))
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = STATIC_MAX_AGE
+
+# Smallest response body in bytes that is compressed, smaller ones aren't worth it
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+
+# Content types of the responses that are compressed
+COMPRESS_MIMETYPES = {"text/html", "text/css", "text/plain", "application/javascript", "text/javascript", "application/json"}
+
+# Process-wide model registry, filled once per worker by load_models()
+_model_registry = {}
+_model_registry_lock = threading.Lock()
+
+# Held while the models run, so requests on different threads take turns instead of
+# competing for the CPU (and the fast tokenizer, which can't be shared between threads)
+_inference_lock = threading.Lock()
+
+# Punkt sentence tokenizer, loaded by get_sentence_tokenizer()
+_sentence_tokenizer = None
+
+# Domain extractor, created by get_domain_extractor()
+_domain_extractor = None
+
+# Templates compiled before the first request by load_templates(), and the macros of
+# templates/fragments.html, loaded by get_template_fragments()
+TEMPLATES = ["index.html", "article.html", "fragments.html"]
+_template_fragments = None
+
+# Maximum number of rendered entity spans kept by render_entity_span. The same entities
+# come up again and again with the same sentiment, so most spans are rendered only once
+ENTITY_SPAN_CACHE_SIZE = int(os.environ.get("ENTITY_SPAN_CACHE_SIZE", "4096"))
+_entity_span_cache = {}
+
 def initialize_nltk():
     """Locate NLTK data"""
+    import nltk
     
     # Add app directory to NLTK's data path
     nltk.data.path.append(os.path.join(os.path.dirname(__file__), "nltk_data"))
+
+def load_models():
+    """
+    Load the NER pipeline and target sentiment classifier into the model registry.
+    Models are only loaded the first time this is called in a worker, every later
+    call returns the shared instances
+    
+    Returns:
+        Tuple of (NER pipeline, target sentiment classifier)
+    """
+    with _model_registry_lock:
+        if "ner" not in _model_registry:
+            from transformers import AutoTokenizer, pipeline
+            tokenizer = AutoTokenizer.from_pretrained(NER_MODEL_NAME)
+            model = load_ner_model()
+
+            # Use aggregation_strategy to get word-level entities
+            _model_registry["ner"] = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+        
+        if "tsc" not in _model_registry:
+            from NewsSentiment import TargetSentimentClassifier
+            _model_registry["tsc"] = TargetSentimentClassifier()
+    
+    return _model_registry["ner"], _model_registry["tsc"]
+
+def load_ner_model():
+    """
+    Load the NER model for the configured backend, see NER_BACKEND
+    
+    Returns:
+        Token classification model that can be passed to a transformers pipeline
+    """
+    if NER_BACKEND == "onnx":
+        from optimum.onnxruntime import ORTModelForTokenClassification
+        
+        # Reuse the saved export if there is one, otherwise export the model and save it
+        export_dir = os.path.join(NER_ONNX_DIR, NER_MODEL_NAME.replace("/", "--"))
+        if os.path.exists(os.path.join(export_dir, "model.onnx")):
+            return ORTModelForTokenClassification.from_pretrained(export_dir)
+        
+        model = ORTModelForTokenClassification.from_pretrained(NER_MODEL_NAME, export=True)
+        try:
+            model.save_pretrained(export_dir)
+        except OSError as e:
+            # The export still works for this worker if it can't be saved, e.g. on a read-only filesystem
+            print(f"Error saving ONNX export of the NER model: {str(e)}")
+        return model
+    
+    from transformers import AutoModelForTokenClassification
+    model = AutoModelForTokenClassification.from_pretrained(NER_MODEL_NAME)
+    
+    if NER_BACKEND == "quantized":
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif NER_BACKEND != "torch":
+        raise ValueError(f"Unknown NER_BACKEND {NER_BACKEND!r}, expected torch, quantized or onnx")
+    
+    return model
+
+def get_ner_pipeline():
+    """Return the shared NER pipeline, loading it if needed"""
+    return load_models()[0]
+
+def get_tsc():
+    """Return the shared target sentiment classifier, loading it if needed"""
+    return load_models()[1]
+
+def prepare_models_for_workers():
+    """
+    Load everything the analysis needs before gunicorn forks its workers (see
+    gunicorn.conf.py), so the workers share one copy of the model weights through
+    copy-on-write instead of each loading their own
+    """
+    initialize_nltk()
+    get_sentence_tokenizer()
+    load_templates()
+    ner, tsc = load_models()
+    
+    # Put every torch module into inference-only state, so nothing writes to the weight pages
+    modules = [getattr(ner, "model", None)] + list(vars(tsc).values())
+    for module in modules:
+        if hasattr(module, "eval") and hasattr(module, "parameters"):
+            module.eval()
+            for parameter in module.parameters():
+                parameter.requires_grad_(False)
+    
+    # Move everything loaded so far out of the garbage collector's reach. Collections
+    # write to the headers of the objects they scan, which would copy their pages into
+    # every worker
+    gc.collect()
+    gc.freeze()
+
+def profile_startup():
+    """
+    Report how long each heavy library takes to import, and how long the NLTK data,
+    public suffix list and models take to load. Each import's time leaves out the
+    modules already imported before it; run with python -X importtime for a breakdown
+    """
+    timings = []
+    for module_name in STARTUP_MODULES:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            print(f"Could not import {module_name}: {str(e)}")
+            continue
+        timings.append((f"import {module_name}", time.perf_counter() - started))
+    
+    for name, load in [
+        ("Punkt sentence tokenizer", get_sentence_tokenizer),
+        ("public suffix list", lambda: get_domain_extractor()("https://www.bbc.co.uk/news")),
+        ("NER pipeline and target sentiment classifier", load_models)
+    ]:
+        started = time.perf_counter()
+        load()
+        timings.append((f"load {name}", time.perf_counter() - started))
+    
+    width = max(len(name) for name, _ in timings)
+    for name, seconds in timings:
+        print(f"{name:<{width}}  {seconds:8.3f}s")
+    print(f"{'total':<{width}}  {sum(seconds for _, seconds in timings):8.3f}s")
+
+def get_process_memory(pid):
+    """
+    Measure a process's memory from /proc
+    
+    Args:
+        pid: Process id
+        
+    Returns:
+        Dictionary with the process's resident memory, proportional share of memory
+        (PSS), memory shared with other processes and memory unique to it, in MB.
+        Only resident and shared memory are given if /proc/<pid>/smaps_rollup isn't available
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) / 1024  # kB to MB
+        
+        return {
+            "rss_mb": fields.get("Rss", 0),
+            "pss_mb": fields.get("Pss", 0),
+            "shared_mb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+            "unique_mb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+        }
+    except OSError:
+        # Fall back to the resident and file-backed shared pages
+        with open(f"/proc/{pid}/statm") as f:
+            _, resident, shared = (int(value) for value in f.read().split()[:3])
+        page_mb = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        return {"rss_mb": resident * page_mb, "pss_mb": None, "shared_mb": shared * page_mb, "unique_mb": (resident - shared) * page_mb}
+
+def get_memory_report(master_pid=None):
+    """
+    Report the memory of the gunicorn master and each of its workers, to show how much
+    of the workers' memory is shared model weights and how much is their own
+    
+    Args:
+        master_pid: Process id of the gunicorn master, defaults to this process's parent
+        
+    Returns:
+        Dictionary with the memory of each process (see get_process_memory), and the
+        total memory used by all of them counting shared pages once (the sum of their PSS)
+    """
+    master_pid = master_pid or os.getppid()
+    
+    # Find the master's child processes
+    worker_pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The parent pid is the second field after the command name, which can contain spaces
+                parent_pid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent_pid == master_pid:
+            worker_pids.append(int(entry))
+    
+    processes = []
+    for role, pid in [("master", master_pid)] + [("worker", pid) for pid in sorted(worker_pids)]:
+        try:
+            processes.append({"pid": pid, "role": role, **get_process_memory(pid)})
+        except OSError as e:
+            print(f"Error reading memory of process {pid}: {str(e)}")
+    
+    pss = [process["pss_mb"] for process in processes]
+    return {
+        "processes": processes,
+        "total_pss_mb": sum(pss) if None not in pss else None
+    }
+
+def models_ready():
+    """Check whether this worker has finished loading its models"""
+    return "ner" in _model_registry and "tsc" in _model_registry
+
+# Histograms of article stage timings and counts, shared by all requests in this worker
+_histograms = {}
+_metrics_lock = threading.Lock()
+article_error_count = 0
+
+def new_article_stats():
+    """
+    Create the stats for one article's analysis, filled in by the functions it is passed to
+    
+    Returns:
+        Dictionary with the seconds spent in each stage, and the number of sentences
+        analysed, long sentences split into phrases, entity mentions, target sentiment
+        batches run, sentences found in the sentence cache and sentences the models
+        failed on
+    """
+    return {"stages": {}, "sentences": 0, "phrases_split": 0, "entities": 0, "tsc_calls": 0, "cache_hits": 0, "failed_sentences": 0}
+
+@contextmanager
+def time_stage(stats, stage):
+    """Add the time spent in a block to a stage of an article's stats, does nothing if stats is None"""
+    if stats is None:
+        yield
+        return
+    
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats["stages"][stage] = stats["stages"].get(stage, 0) + time.perf_counter() - started
+
+def observe_histogram(name, value, buckets, **labels):
+    """Add a value to a histogram, see format_metrics"""
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0, "count": 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram["counts"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+def record_article_metrics(url, stats):
+    """
+    Add an analysed article's stage timings and counts to the metrics histograms, and
+    log them if METRICS_LOG is set
+    
+    Args:
+        url: Article URL
+        stats: The article's stats, see new_article_stats
+    """
+    for stage, seconds in stats["stages"].items():
+        observe_histogram("article_stage_seconds", seconds, STAGE_SECONDS_BUCKETS, stage=stage)
+    for name in ("sentences", "phrases_split", "entities", "tsc_calls", "cache_hits", "failed_sentences"):
+        observe_histogram(f"article_{name}", stats[name], ARTICLE_COUNT_BUCKETS)
+    
+    if METRICS_LOG:
+        print(json.dumps({
+            "message": "Article analysed",
+            "url": url,
+            "stage_seconds": {stage: round(seconds, 4) for stage, seconds in stats["stages"].items()},
+            **{name: value for name, value in stats.items() if name != "stages"}
+        }))
+
+def format_metrics():
+    """
+    Format the metrics of this worker in the Prometheus text format. The metrics are kept
+    per gunicorn worker, and a scrape is answered by whichever worker gets it, so every
+    series has a worker label with the worker's process id. That way each worker's series
+    only ever goes up, and totals are summed across workers in the query, e.g.
+    sum without (worker) (article_errors_total)
+    
+    Returns:
+        Metrics text, with the article stage timing and count histograms and the cache
+        and error counters
+    """
+    descriptions = {
+        "article_stage_seconds": "Seconds spent in each stage of an article's analysis",
+        "article_sentences": "Sentences analysed per article",
+        "article_phrases_split": "Phrases long sentences were split into per article",
+        "article_entities": "Entity mentions found per article",
+        "article_tsc_calls": "Target sentiment classifier batches run per article",
+        "article_cache_hits": "Sentences found in the sentence cache per article",
+        "article_failed_sentences": "Sentences the models failed on per article"
+    }
+    
+    worker = (("worker", os.getpid()),)
+    
+    def format_labels(labels):
+        return "{" + ",".join(f'{key}="{value}"' for key, value in worker + labels) + "}"
+    
+    lines = []
+    with _metrics_lock:
+        for name, description in descriptions.items():
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+            for (histogram_name, labels), histogram in sorted(_histograms.items()):
+                if histogram_name != name:
+                    continue
+                for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+    
+    counters = [
+        ("sentence_cache_lookups_total", "Sentence cache lookups by result", sentence_cache_stats),
+        ("download_cache_requests_total", "Article downloads by download cache result", download_cache_stats),
+        ("result_cache_requests_total", "Article requests by result cache result", result_cache_stats)
+    ]
+    for name, description, stats in counters:
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+        lines += [f'{name}{format_labels((("result", result),))} {count}' for result, count in stats.items()]
+    
+    lines += [
+        "# HELP article_errors_total Articles that couldn't be extracted or analysed",
+        "# TYPE article_errors_total counter",
+        f"article_errors_total{format_labels(())} {article_error_count}"
+    ]
+    
+    return "\n".join(lines) + "\n"
+
+def record_article_error():
+    """Count an article that couldn't be extracted or analysed"""
+    global article_error_count
+    with _metrics_lock:
+        article_error_count += 1
  
+# Sentence-level inference cache, shared by all requests in this worker
+_sentence_cache = OrderedDict()
+_sentence_cache_lock = threading.Lock()
+_sentence_cache_db = None
+sentence_cache_stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+def get_model_identifier():
+    """Identify the models whose output is stored in the sentence cache"""
+    identifier = f"{NER_MODEL_NAME}|{TSC_MODEL_NAME}"
+    
+    # Quantized and ONNX models can find slightly different entities, so their results are cached separately
+    if NER_BACKEND != "torch":
+        identifier += f"|{NER_BACKEND}"
+    
+    # Long sentences split with overlapping phrases can find different entities
+    if NER_WINDOW_STRIDE:
+        identifier += f"|stride{NER_WINDOW_STRIDE}"
+    
+    # Packed NER results depend on the neighbouring sentences, so they are never cached
+    return identifier
+
+def get_sentence_cache_key(sentence):
+    """
+    Build the cache key for a sentence from a hash of its normalised text and the model identifier
+    """
+    normalised = " ".join(unicodedata.normalize("NFC", sentence).split())
+    return hashlib.sha256(f"{get_model_identifier()}\n{normalised}".encode("utf-8")).hexdigest()
+
+def get_sentence_cache_db():
+    """Open the on-disk sentence cache, returns None if it is not configured. Call with the cache lock held"""
+    global _sentence_cache_db
+    if _sentence_cache_db is None and SENTENCE_CACHE_PATH:
+        _sentence_cache_db = sqlite3.connect(SENTENCE_CACHE_PATH, check_same_thread=False)
+        _sentence_cache_db.execute("CREATE TABLE IF NOT EXISTS sentences (key TEXT PRIMARY KEY, entities TEXT NOT NULL)")
+        _sentence_cache_db.commit()
+    return _sentence_cache_db
+
+def get_cached_sentence(sentence):
+    """
+    Look up the analysed entities of a sentence in the memory cache, then the disk cache
+    
+    Args:
+        sentence: Sentence to look up
+        
+    Returns:
+        List of entities positioned relative to the sentence, or None if the sentence is not cached
+    """
+    key = get_sentence_cache_key(sentence)
+    entities = None
+    
+    try:
+        with _sentence_cache_lock:
+            if key in _sentence_cache:
+                _sentence_cache.move_to_end(key)
+                entities = _sentence_cache[key]
+                sentence_cache_stats["hits"] += 1
+            else:
+                db = get_sentence_cache_db()
+                row = db.execute("SELECT entities FROM sentences WHERE key = ?", (key,)).fetchone() if db else None
+                if row:
+                    entities = json.loads(row[0])
+                    sentence_cache_stats["disk_hits"] += 1
+                    
+                    # Promote to the memory cache
+                    if SENTENCE_CACHE_SIZE > 0:
+                        _sentence_cache[key] = entities
+                        if len(_sentence_cache) > SENTENCE_CACHE_SIZE:
+                            _sentence_cache.popitem(last=False)
+                else:
+                    sentence_cache_stats["misses"] += 1
+    except Exception as e:
+        print(f"Error reading sentence cache: {str(e)}")
+        return None
+    
+    # Normalisation can map different spellings of a sentence to one key, so only
+    # use the cached positions if they line up with this exact sentence
+    if entities is not None and any(sentence[e['start']:e['end']] != e['entity'] for e in entities):
+        return None
+    
+    return entities
+
+def store_cached_sentences(results):
+    """
+    Store analysed sentences in the memory cache and, if configured, the disk cache
+    
+    Args:
+        results: Dictionary mapping sentences to their entities, as returned by analyse_sentences
+    """
+    if not results:
+        return
+    
+    try:
+        with _sentence_cache_lock:
+            if SENTENCE_CACHE_SIZE > 0:
+                for sentence, entities in results.items():
+                    key = get_sentence_cache_key(sentence)
+                    _sentence_cache[key] = entities
+                    _sentence_cache.move_to_end(key)
+                
+                # Evict least recently used sentences
+                while len(_sentence_cache) > SENTENCE_CACHE_SIZE:
+                    _sentence_cache.popitem(last=False)
+            
+            db = get_sentence_cache_db()
+            if db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO sentences (key, entities) VALUES (?, ?)",
+                    [(get_sentence_cache_key(sentence), json.dumps(entities)) for sentence, entities in results.items()]
+                )
+                db.commit()
+    except Exception as e:
+        print(f"Error writing sentence cache: {str(e)}")
+
+def get_domain_extractor():
+    """
+    Return the tldextract extractor, creating it the first time it is needed. It reads
+    the public suffix list from TLDEXTRACT_SUFFIX_LIST or tldextract's bundled snapshot,
+    never from the network, and doesn't write a cache to disk
+    """
+    global _domain_extractor
+    if _domain_extractor is None:
+        import tldextract
+        suffix_list_urls = (f"file://{os.path.abspath(TLDEXTRACT_SUFFIX_LIST)}",) if TLDEXTRACT_SUFFIX_LIST else ()
+        _domain_extractor = tldextract.TLDExtract(cache_dir=None, suffix_list_urls=suffix_list_urls)
+    return _domain_extractor
+
 def get_publication_details(url):
     """
     Extract publication details from the URL with error handling
     """
     try:
         # Use tldextract to get domain information
-        ext = tldextract.extract(url)
+        ext = get_domain_extractor()(url)
         
         # Default values
         details = {
@@ -279,193 +921,677 @@ def filter_authors(authors, publication_name):
     
     return filtered_authors
 
-def analyse_sentiment_newssentiment(text):
+def get_sentence_tokenizer():
+    """Return the Punkt sentence tokenizer, loading it the first time it is needed"""
+    global _sentence_tokenizer
+    if _sentence_tokenizer is None:
+        from nltk.tokenize.punkt import PunktTokenizer
+        initialize_nltk()
+        _sentence_tokenizer = PunktTokenizer("english")
+    return _sentence_tokenizer
+
+def iter_sentence_spans(text):
+    """
+    Split text into sentences, skipping all-caps sentences that are likely hyperlinks
+    
+    Args:
+        text: Text to split
+        
+    Yields:
+        (start, end, sentence) tuples, where start and end are the sentence's exact position in text
+    """
+    for start, end in get_sentence_tokenizer().span_tokenize(text):
+        sentence = text[start:end]
+        
+        # Count the words with 2+ chars and how many of them are all caps
+        words = 0
+        caps_words = 0
+        for match in WORD_PATTERN.finditer(sentence):
+            words += 1
+            if match.group().isupper():
+                caps_words += 1
+        
+        # Skip if sentence is empty after filtering
+        if not words:
+            continue
+        
+        # Keep sentence if less than 80% of words are all caps
+        if caps_words / words < 0.8:
+            yield start, end, sentence
+
+def analyse_sentiment_newssentiment(text, sentence_results=None, progress=None, stats=None):
     """
     Analyse sentiment of text using NewsSentiment with sentence-level chunking
     for handling long texts and entity sentiment analysis
+
+    Args:
+        text: Text to analyse
+        sentence_results: Optional dictionary of per-sentence results from an earlier call
+            (see analyse_sentences). Sentences found in it are not run through the models
+            again, and newly analysed sentences are added to it
+        progress: Optional callable, called with the number of sentences analysed so far
+            and the total number of sentences
+        stats: Optional article stats to record stage timings and counts in, see new_article_stats
+
+    Returns:
+        Tuple of (highlighted HTML of the text, entity sentiments)
     """
     if not text:
-        return "", "", {}
+        return "", {}
     
     try:
-        # Pre-process: remove all-caps sentences that are likely hyperlinks
-        sentences = sent_tokenize(text)
-        filtered_sentences = []
+        highlighted_parts = []
+        entity_sentiments = {}
         
-        for sentence in sentences:
-            # Check if sentence is all uppercase (allowing for punctuation and spaces)
-            words = [w for w in re.findall(r'\w+', sentence) if len(w) > 1]  # Only consider words with 2+ chars
-            
-            # Skip if sentence is empty after filtering
-            if not words:
-                continue
-                
-            # Calculate percentage of all-caps words
-            caps_words = [w for w in words if w.isupper()]
-            caps_percentage = len(caps_words) / len(words) if words else 0
+        for batch in iter_sentiment_batches(text, sentence_results, stats=stats):
+            highlighted_parts.append(batch["highlighted"])
+            entity_sentiments = batch["entity_sentiments"]
             
-            # Keep sentence if less than 80% of words are all caps
-            if caps_percentage < 0.8:
-                filtered_sentences.append(sentence)
+            if progress:
+                progress(batch["processed"], batch["total"])
         
-        # Rebuild text without all-caps sentences
-        filtered_text = " ".join(filtered_sentences)
+        # Batches are separated by a single space, like the sentences within them
+        return " ".join(highlighted_parts), entity_sentiments
         
-        # If all text was removed, return empty results
-        if not filtered_text.strip():
-            return "", "", {}
-        
-        # Load NER model
-        tokenizer = AutoTokenizer.from_pretrained("dslim/bert-large-NER")
-        model = AutoModelForTokenClassification.from_pretrained("dslim/bert-large-NER")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Error in analyze_entity_sentiments: {str(e)}")
+        return html.escape(text), {}
 
-        # Use aggregation_strategy to get word-level entities
-        nlp = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+def get_entity_sentiments(text, sentence_results=None, stats=None):
+    """
+    Analyse text like analyse_sentiment_newssentiment, without rendering the highlighted
+    HTML, for callers that only report the entities. Errors are raised, not hidden
+    
+    Args:
+        text: Text to analyse
+        sentence_results: Optional dictionary of per-sentence results, see analyse_sentiment_newssentiment
+        stats: Optional article stats to record stage timings and counts in, see new_article_stats
         
-        # Initialize target sentiment classifier
-        tsc = TargetSentimentClassifier()
+    Returns:
+        Entity sentiments of the whole text
+    """
+    entity_sentiments = {}
+    for batch in iter_sentiment_batches(text, sentence_results, stats=stats, highlight=False):
+        entity_sentiments = batch["entity_sentiments"]
+    return entity_sentiments
 
-        # Store entity sentiment data across all sentences
-        entity_sentiments = {}
+def iter_sentiment_batches(text, sentence_results=None, batch_size=None, stats=None, highlight=True):
+    """
+    Analyse text in batches of sentences, yielding the HTML for each batch as soon as it is ready
+    
+    Args:
+        text: Text to analyse
+        sentence_results: Optional dictionary of per-sentence results, see analyse_sentiment_newssentiment
+        batch_size: Number of sentences per batch, defaults to ANALYSIS_GROUP_SIZE
+        stats: Optional article stats to record stage timings and counts in, see new_article_stats
+        highlight: Whether to render the highlighted HTML, callers that only need the
+            entity sentiments can skip it
+        
+    Yields:
+        Dictionaries with the number of sentences processed so far and in total, the
+        highlighted HTML of the batch's sentences (None if highlight is off), and the
+        entity sentiments of every batch so far
+    """
+    if batch_size is None:
+        batch_size = ANALYSIS_GROUP_SIZE
+    if sentence_results is None:
+        sentence_results = {}
+    
+    # Pre-process: split into sentences, removing all-caps sentences that are likely hyperlinks
+    with time_stage(stats, "sentence_split"):
+        filtered_spans = list(iter_sentence_spans(text))
+    if stats is not None:
+        stats["sentences"] += len(filtered_spans)
+    
+    # Store entity sentiment data across all sentences
+    entity_sentiments = {}
+    
+    for batch_start in range(0, len(filtered_spans), batch_size):
+        batch = filtered_spans[batch_start:batch_start + batch_size]
+        
+        # Only run the models on sentences that have not been analysed already. Packed NER
+        # reads each sentence alongside its neighbours, so it gets the whole batch in text order
+        batch_sentences = [sentence for _, _, sentence in batch]
+        pending_sentences = [sentence for sentence in dict.fromkeys(batch_sentences) if sentence not in sentence_results]
+        if pending_sentences:
+            analysed = analyse_sentences(batch_sentences if NER_PACKING == "packed" else pending_sentences, stats)
+            for sentence, entities in analysed.items():
+                sentence_results.setdefault(sentence, entities)
         
-        # Track overall position in the original text
-        current_position = 0
+        # Add the entities of each sentence at their exact position in the article text
         entity_data_all = []
+        for start, _, sentence in batch:
+            for mention in sentence_results[sentence]:
+                add_entity_sentiment(mention, start, entity_sentiments, entity_data_all)
+        if stats is not None:
+            stats["entities"] += len(entity_data_all)
         
-        # Process each sentence separately
-        for sentence in filtered_sentences:
-            # Skip empty sentences
-            if not sentence.strip():
-                current_position += len(sentence) + 1  # +1 for the space added between sentences
-                continue
-            
-            # Get the exact position of this sentence in the original text
-            sentence_position = filtered_text.find(sentence, current_position)
-            if sentence_position == -1:  # Should never happen with proper sentence tokenization
-                sentence_position = current_position
+        highlighted_html = None
+        if highlight:
+            with time_stage(stats, "render"):
+                highlighted_html = render_highlighted_text(text, entity_data_all, [(start, end) for start, end, _ in batch])
+        
+        yield {
+            "processed": batch_start + len(batch),
+            "total": len(filtered_spans),
+            "highlighted": highlighted_html,
+            "entity_sentiments": entity_sentiments
+        }
+
+def load_templates():
+    """
+    Compile the page templates and fragments, so the first request doesn't pay for it.
+    Flask keeps compiled templates for the life of the worker, and the fragments are
+    kept by get_template_fragments
+    """
+    for name in TEMPLATES:
+        app.jinja_env.get_template(name)
+    get_template_fragments()
+
+def get_template_fragments():
+    """Return the macros of templates/fragments.html, compiling them the first time"""
+    global _template_fragments
+    if _template_fragments is None:
+        _template_fragments = app.jinja_env.get_template("fragments.html").module
+    return _template_fragments
+
+def render_entity_span(text, sentiment, confidence):
+    """
+    Render the highlighted span for an entity with the entity_span macro, reusing the
+    span rendered the last time the same entity had the same sentiment and confidence
+    
+    Args:
+        text: Entity text as it appears in the article
+        sentiment: "positive", "neutral" or "negative"
+        confidence: Confidence of the sentiment, shown to two decimal places
+        
+    Returns:
+        HTML string
+    """
+    key = (text, sentiment, round(confidence, 2))
+    span = _entity_span_cache.get(key)
+    if span is None:
+        span = str(get_template_fragments().entity_span(*key))
+        
+        # Start again rather than tracking which spans were used least recently, the
+        # common ones are back after a few sentences
+        if len(_entity_span_cache) >= ENTITY_SPAN_CACHE_SIZE:
+            _entity_span_cache.clear()
+        _entity_span_cache[key] = span
+    return span
+
+def render_highlighted_text(text, entity_data_all, spans=None):
+    """
+    Create the highlighted HTML version of text, with each entity in a span whose class
+    gives its sentiment. The colours come from the page's stylesheet, so turning the
+    highlighting off only changes a class on the results
+    
+    Args:
+        text: Text the entities were found in
+        entity_data_all: List of (entity, start, end, sentiment, confidence) tuples, positioned in text
+        spans: Optional list of (start, end) positions of the sentences of text to render,
+            in order. They are rendered separated by a single space, so sentences that
+            were filtered out are left out. Defaults to the whole of text
+        
+    Returns:
+        HTML string
+    """
+    if spans is None:
+        spans = [(0, len(text))]
+    
+    # Sort entities by their position in text
+    entity_data_all = sorted(entity_data_all, key=lambda x: x[1])
+    
+    # Create highlighted HTML version with correct positioning, built up as a list of fragments
+    highlighted_parts = []
+    
+    # Handle potential overlapping entities
+    filtered_entities = resolve_overlapping_entities(entity_data_all)
+    entity_index = 0
+    
+    for span_index, (span_start, span_end) in enumerate(spans):
+        if span_index:
+            highlighted_parts.append(" ")
+        last_pos = span_start
+        
+        # Generate highlighted text with the non-overlapping entities in this sentence
+        while entity_index < len(filtered_entities) and filtered_entities[entity_index][1] < span_end:
+            entity, start, end, sentiment, confidence = filtered_entities[entity_index]
+            entity_index += 1
             
-            # Update current position for next iteration
-            current_position = sentence_position + len(sentence)
-                
-            # Check if sentence length is within model's token limit
-            tokens = tokenizer.encode(sentence)
-            if len(tokens) > 510:  # Leave room for special tokens
-                # For extra long sentences, split into phrases by word boundaries while respecting token limits
-                phrases = []
-                current_phrase = ""
-                
-                for word in sentence.split():
-                    if len(tokenizer.encode(current_phrase + " " + word)) <= 510:
-                        current_phrase += " " + word if current_phrase else word
-                    else:
-                        if current_phrase:
-                            phrases.append(current_phrase)
-                        current_phrase = word
-                
-                if current_phrase:
-                    phrases.append(current_phrase)
-                
-                # Process each phrase
-                for phrase in phrases:
-                    if not phrase.strip():
-                        continue
-                    
-                    # Find exact position of this phrase in the original text
-                    phrase_position = filtered_text.find(phrase, sentence_position)
-                    if phrase_position == -1:  # If not found exactly, use relative positioning
-                        phrase_position = sentence_position
-                        sentence_position += len(phrase)
-                    else:
-                        sentence_position = phrase_position + len(phrase)
-                    
-                    # Process this phrase
-                    process_chunk(phrase, phrase_position, nlp, tsc, entity_sentiments, entity_data_all)
-            else:
-                # Process the sentence normally
-                process_chunk(sentence, sentence_position, nlp, tsc, entity_sentiments, entity_data_all)
-        
-        # Sort entities by their position in text
-        entity_data_all.sort(key=lambda x: x[1])
-        
-        # Create highlighted HTML version with correct positioning
-        highlighted_text = ""
-        plain_text = html.escape(filtered_text)
-        last_pos = 0
-        
-        # Handle potential overlapping entities
-        filtered_entities = []
-        for i, (entity, start, end, sentiment, confidence) in enumerate(entity_data_all):
-            # Skip this entity if it overlaps with a higher confidence entity we've already included
-            should_skip = False
-            for prev_entity, prev_start, prev_end, prev_sentiment, prev_confidence in filtered_entities:
-                # Check for overlap
-                if (start < prev_end and end > prev_start):
-                    # Keep only the higher confidence entity
-                    should_skip = confidence <= prev_confidence
-                    break
-            
-            if not should_skip:
-                filtered_entities.append((entity, start, end, sentiment, confidence))
-        
-        # Generate highlighted text with non-overlapping entities
-        for entity, start, end, sentiment, confidence in filtered_entities:
             # Ensure start and end positions are valid
-            if start < 0 or end > len(filtered_text) or start >= end:
+            if start < last_pos or end > span_end or start >= end:
                 continue
-                
+            
             # Add text before entity
-            highlighted_text += html.escape(filtered_text[last_pos:start])
+            highlighted_parts.append(html.escape(text[last_pos:start]))
             
-            # Determine color based on sentiment
-            if sentiment == "positive":
-                color = "#90EE90"  # Light green for positive
-            elif sentiment == "negative":
-                color = "#FFB6C1"  # Light red for negative
-            else:
-                color = "#F0F8FF"  # Light blue for neutral
+            # Anything that isn't positive or negative is shown as neutral
+            if sentiment not in ("positive", "negative"):
+                sentiment = "neutral"
             
             # Add highlighted entity with tooltip
-            entity_span = f'<span style="background-color: {color};" title="{sentiment} (confidence: {confidence:.2f})">{html.escape(filtered_text[start:end])}</span>'
-            highlighted_text += entity_span
+            highlighted_parts.append(render_entity_span(text[start:end], sentiment, confidence))
             
             last_pos = end
         
-        # Add remaining text
-        highlighted_text += html.escape(filtered_text[last_pos:])
-        
-        return plain_text, highlighted_text, entity_sentiments
-        
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Error in analyze_entity_sentiments: {str(e)}")
-        escaped_text = html.escape(text) if text else ""
-        return escaped_text, escaped_text, {}
+        # Add the rest of the sentence
+        highlighted_parts.append(html.escape(text[last_pos:span_end]))
+    
+    return "".join(highlighted_parts)
 
-def process_chunk(chunk, chunk_position, nlp, tsc, entity_sentiments, entity_data_all):
+def resolve_overlapping_entities(entities):
     """
-    Process a single chunk (sentence or phrase) for entity sentiment analysis
-    and add results to the overall data structures
+    Choose which entities to highlight when some of them overlap. Entities are swept
+    once in position order and grouped into runs that overlap each other. Within a run
+    the highest confidence entities are kept first, then any others that don't overlap them
     
     Args:
-        chunk: Text chunk to process
-        chunk_position: Exact position of this chunk in the original text
+        entities: List of (entity, start, end, sentiment, confidence) tuples sorted by start position
+        
+    Returns:
+        List of non-overlapping entity tuples sorted by start position
+    """
+    resolved = []
+    group = []
+    group_end = 0
+    
+    def resolve_group():
+        if len(group) == 1:
+            resolved.append(group[0])
+            return
+        
+        # Highest confidence first, earlier entities win ties
+        kept = []
+        for entity in sorted(group, key=lambda e: (-e[4], e[1])):
+            if all(entity[2] <= other[1] or entity[1] >= other[2] for other in kept):
+                kept.append(entity)
+        resolved.extend(sorted(kept, key=lambda e: e[1]))
+    
+    for entity in entities:
+        start, end = entity[1], entity[2]
+        
+        # An entity starting after the end of the current group begins a new group
+        if group and start >= group_end:
+            resolve_group()
+            group = []
+        
+        group_end = max(group_end, end) if group else end
+        group.append(entity)
+    
+    if group:
+        resolve_group()
+    
+    return resolved
+
+def analyse_sentences(sentences, stats=None):
+    """
+    Run NER and target sentiment analysis over a list of sentences. Sentences found
+    in the sentence cache are not run through the models.
+    
+    With packed NER each sentence is read alongside its neighbours, so the sentences
+    should be given in text order, repeats included. They all run through the models
+    in that order, and the cache is neither read nor written
+    
+    Args:
+        sentences: List of sentences to analyse
+        stats: Optional article stats to record stage timings and counts in, see new_article_stats
+        
+    Returns:
+        Dictionary mapping each sentence to a list of its entities, with start and end
+        positions relative to the sentence
+    """
+    results = {}
+
+    # Check the cache before running any model
+    if NER_PACKING == "packed":
+        uncached_sentences = sentences
+    else:
+        for sentence in sentences:
+            cached = get_cached_sentence(sentence)
+            if cached is not None:
+                results[sentence] = cached
+        uncached_sentences = [sentence for sentence in sentences if sentence not in results]
+        if stats is not None:
+            stats["cache_hits"] += len(results)
+
+    # Run the models over the rest in groups, so other threads get a turn between groups.
+    # A repeated sentence keeps the results of its first occurrence
+    for group_start in range(0, len(uncached_sentences), ANALYSIS_GROUP_SIZE):
+        with time_stage(stats, "inference_wait"):
+            _inference_lock.acquire()
+        try:
+            group_results = run_models_on_sentences(uncached_sentences[group_start:group_start + ANALYSIS_GROUP_SIZE], stats)
+        finally:
+            _inference_lock.release()
+        for sentence, entities in group_results.items():
+            results.setdefault(sentence, entities)
+    
+    return results
+
+def run_models_on_sentences(sentences, stats=None):
+    """
+    Run NER and target sentiment analysis over a list of sentences, and store the
+    results in the sentence cache
+    
+    Args:
+        sentences: List of sentences to analyse
+        stats: Optional article stats to record stage timings and counts in, see new_article_stats
+        
+    Returns:
+        Dictionary mapping each sentence to a list of its entities, with start and end
+        positions relative to the sentence
+    """
+    # Get the shared NER pipeline and target sentiment classifier for this worker
+    nlp = get_ner_pipeline()
+    tokenizer = nlp.tokenizer
+    tsc = get_tsc()
+
+    # Tokenise every sentence once, the offset mappings are used to split long sentences
+    with time_stage(stats, "tokenise"):
+        offset_mappings = tokenizer(sentences, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+
+    # Chunks (sentences or phrases) to run through NER, with the number and text of the
+    # sentence they belong to, their position within it and the part of the sentence
+    # whose entities they report
+    chunks = []
+    chunk_token_counts = []
+    
+    # A sentence can be given more than once for packed NER, only its first occurrence is reported
+    first_occurrences = {}
+
+    # Split each sentence into chunks that fit the model's token limit
+    for sentence_number, (sentence, offsets) in enumerate(zip(sentences, offset_mappings)):
+        first_occurrences.setdefault(sentence, sentence_number)
+        if len(offsets) > MAX_NER_TOKENS:
+            # For extra long sentences, split into phrases at token boundaries. Each phrase
+            # fills close to a whole NER window, so it is never packed with other chunks
+            for start, end, owned_start, owned_end in split_long_sentence(offsets):
+                chunks.append((sentence_number, sentence, sentence[start:end], start, owned_start, owned_end))
+                chunk_token_counts.append(MAX_NER_TOKENS)
+                if stats is not None:
+                    stats["phrases_split"] += 1
+        else:
+            # Process the sentence normally
+            chunks.append((sentence_number, sentence, sentence, 0, 0, len(sentence)))
+            chunk_token_counts.append(len(offsets))
+
+    # Run NER over every chunk in batches
+    chunk_texts = [chunk for _, _, chunk, _, _, _ in chunks]
+    with time_stage(stats, "ner"):
+        if NER_PACKING == "packed":
+            ner_results_all = run_ner_packed(chunk_texts, chunk_token_counts, nlp)
+        else:
+            ner_results_all = run_ner_batched(chunk_texts, nlp)
+            
+            if NER_PACKING == "compare":
+                # Report how packing would change the entities, without changing the results
+                compare_ner_results(chunk_texts, ner_results_all, run_ner_packed(chunk_texts, chunk_token_counts, nlp))
+
+    # Collect every entity mention in text order, grouped by sentence
+    new_results = {sentence: [] for sentence in sentences}
+    failed_sentences = set()
+    for (sentence_number, sentence, chunk, chunk_position, owned_start, owned_end), ner_results in zip(chunks, ner_results_all):
+        if first_occurrences[sentence] != sentence_number:
+            continue
+        if ner_results is None:
+            failed_sentences.add(sentence)
+        chunk_mentions = []
+        process_chunk(chunk, chunk_position, ner_results, chunk_mentions)
+
+        # Overlapping phrases see the same entities, only keep those in the part this phrase reports
+        new_results[sentence].extend(
+            mention for mention in chunk_mentions if owned_start <= mention['start'] < owned_end
+        )
+    mentions = [(sentence, mention) for sentence in new_results for mention in new_results[sentence]]
+
+    # Classify the sentiment towards all mentions in batches
+    with time_stage(stats, "tsc"):
+        sentiments = classify_targets_batched(
+            [(mention.pop('left_context'), mention['entity'], mention.pop('right_context')) for _, mention in mentions], tsc
+        )
+    if stats is not None:
+        stats["tsc_calls"] += -(-len(mentions) // max(1, TSC_BATCH_SIZE))
+
+    for (sentence, mention), sentiment in zip(mentions, sentiments):
+        if sentiment is None:
+            # Fall back to neutral if the sentiment for this mention couldn't be classified
+            sentiment = ("neutral", 0.5)
+            failed_sentences.add(sentence)
+        mention['sentiment'], mention['confidence'] = sentiment
+
+    if stats is not None:
+        stats["failed_sentences"] += len(failed_sentences)
+    
+    # Only cache sentences that were fully analysed, and never packed results, which
+    # depend on the sentences around them
+    if NER_PACKING != "packed":
+        store_cached_sentences({
+            sentence: entities for sentence, entities in new_results.items() if sentence not in failed_sentences
+        })
+    
+    return new_results
+
+def split_long_sentence(offsets, max_tokens=None, stride=None):
+    """
+    Split a long sentence into phrases that fit the NER model's token limit. Works in
+    one pass over the sentence's token offset mapping, preferring to cut between words
+    
+    Args:
+        offsets: Offset mapping of the sentence's tokens, from a fast tokenizer
+        max_tokens: Maximum number of tokens per phrase, defaults to MAX_NER_TOKENS
+        stride: Number of tokens shared by consecutive phrases, defaults to NER_WINDOW_STRIDE
+        
+    Returns:
+        List of (start, end, owned_start, owned_end) character positions in the sentence.
+        start and end give the phrase, owned_start and owned_end the part of it whose
+        entities should be kept, so entities in overlapping parts are only counted once
+    """
+    if max_tokens is None:
+        max_tokens = MAX_NER_TOKENS
+    if stride is None:
+        stride = NER_WINDOW_STRIDE
+    stride = max(0, min(stride, max_tokens // 2))
+
+    num_tokens = len(offsets)
+
+    def starts_word(index):
+        # A token starts a new word if there is whitespace between it and the previous token
+        return index == 0 or index >= num_tokens or offsets[index][0] > offsets[index - 1][1]
+
+    windows = []
+    window_start = 0
+    while window_start < num_tokens:
+        window_end = min(window_start + max_tokens, num_tokens)
+        
+        # Move the cut back to the start of a word, unless a single word fills the whole window
+        if window_end < num_tokens:
+            cut = window_end
+            while cut > window_start + stride + 1 and not starts_word(cut):
+                cut -= 1
+            if starts_word(cut) and cut > window_start + stride:
+                window_end = cut
+        
+        windows.append((window_start, window_end))
+        if window_end >= num_tokens:
+            break
+        
+        # Start the next phrase stride tokens back, at the start of a word where possible
+        next_start = window_end - stride
+        while next_start < window_end and not starts_word(next_start):
+            next_start += 1
+        window_start = next_start
+
+    phrases = []
+    for i, (window_start, window_end) in enumerate(windows):
+        # Each phrase keeps entities up to the middle of its overlap with the next phrase
+        owned_start = phrases[-1][3] if phrases else 0
+        if i + 1 < len(windows):
+            owned_end = offsets[(windows[i + 1][0] + window_end) // 2][0]
+        else:
+            owned_end = offsets[-1][1]
+        phrases.append((offsets[window_start][0], offsets[window_end - 1][1], owned_start, owned_end))
+    
+    return phrases
+
+def run_ner_packed(chunks, token_counts, nlp, max_tokens=None):
+    """
+    Run the NER pipeline over text chunks packed together into windows of up to
+    max_tokens tokens, so short sentences share one forward pass. Entities are
+    split back out to the chunk they were found in
+    
+    Args:
+        chunks: List of text chunks (sentences or phrases), in text order
+        token_counts: Number of tokens in each chunk
         nlp: NER pipeline
-        tsc: Target sentiment classifier
-        entity_sentiments: Dictionary to store entity sentiment information
-        entity_data_all: List to store entity position and sentiment data
+        max_tokens: Token budget of each window, defaults to MAX_NER_TOKENS
+        
+    Returns:
+        List of NER results positioned relative to each chunk, in the same order
+        as chunks, None for any chunk whose window failed
     """
-    # Get named entities for this chunk
-    try:
-        ner_results = nlp(chunk)
-    except Exception as e:
-        print(f"Error in NER for chunk: {str(e)}")
+    if max_tokens is None:
+        max_tokens = MAX_NER_TOKENS
+    
+    # Pack consecutive chunks into windows, joined by a space. BERT splits on
+    # whitespace, so the space adds no tokens
+    windows = []
+    for index, (chunk, token_count) in enumerate(zip(chunks, token_counts)):
+        if windows and windows[-1]["tokens"] + token_count <= max_tokens:
+            window = windows[-1]
+            window["starts"].append(len(window["text"]) + 1)
+            window["text"] += " " + chunk
+            window["tokens"] += token_count
+            window["chunks"].append(index)
+        else:
+            windows.append({"text": chunk, "tokens": token_count, "starts": [0], "chunks": [index]})
+    
+    window_results = run_ner_batched([window["text"] for window in windows], nlp)
+    
+    results = [None] * len(chunks)
+    for window, ner_results in zip(windows, window_results):
+        if ner_results is None:
+            continue
+        
+        for index in window["chunks"]:
+            results[index] = []
+        
+        # Each window's entities come back sorted by position, so walk its chunks alongside them
+        chunk_number = 0
+        for entity in ner_results:
+            if entity['start'] is None or entity['end'] is None:
+                continue
+            while (chunk_number + 1 < len(window["chunks"])
+                   and entity['start'] >= window["starts"][chunk_number + 1]):
+                chunk_number += 1
+            
+            index = window["chunks"][chunk_number]
+            chunk_start = window["starts"][chunk_number]
+            
+            # An entity running across a sentence boundary is cut off at the end of its first sentence
+            end = min(entity['end'], chunk_start + len(chunks[index]))
+            results[index].append(dict(entity, start=entity['start'] - chunk_start, end=end - chunk_start))
+    
+    return results
+
+def compare_ner_results(chunks, sentence_results, packed_results):
+    """
+    Compare the entities found with per-sentence NER and with packed NER windows,
+    and print a summary of where they disagree
+    
+    Args:
+        chunks: List of text chunks that were analysed
+        sentence_results: NER results from run_ner_batched
+        packed_results: NER results from run_ner_packed
+        
+    Returns:
+        Dictionary with the number of entities found by both modes and by only one of them
+    """
+    comparison = {"matching": 0, "only_per_sentence": 0, "only_packed": 0}
+    
+    for chunk, sentence_entities, packed_entities in zip(chunks, sentence_results, packed_results):
+        if sentence_entities is None or packed_entities is None:
+            continue
+        
+        sentence_spans = {(e['start'], e['end'], e['entity_group']) for e in sentence_entities}
+        packed_spans = {(e['start'], e['end'], e['entity_group']) for e in packed_entities}
+        
+        comparison["matching"] += len(sentence_spans & packed_spans)
+        comparison["only_per_sentence"] += len(sentence_spans - packed_spans)
+        comparison["only_packed"] += len(packed_spans - sentence_spans)
+        
+        for start, end, group in sentence_spans ^ packed_spans:
+            mode = "per-sentence" if (start, end, group) in sentence_spans else "packed"
+            print(f"NER packing difference, only found {mode}: '{chunk[start:end]}' ({group})")
+    
+    print(f"NER packing comparison: {comparison}")
+    return comparison
+
+def run_ner_batched(chunks, nlp, batch_size=None):
+    """
+    Run the NER pipeline over a list of text chunks in padded batches. Chunks are
+    sorted by length first so each batch holds chunks of similar size and wastes
+    as little padding as possible
+    
+    Args:
+        chunks: List of text chunks (sentences or phrases)
+        nlp: NER pipeline
+        batch_size: Number of chunks per forward pass, defaults to NER_BATCH_SIZE
+        
+    Returns:
+        List of NER results in the same order as chunks, None for any chunk that failed
+    """
+    if batch_size is None:
+        batch_size = NER_BATCH_SIZE
+    batch_size = max(1, batch_size)
+
+    # Order chunk indices by length so similar sized chunks are batched together
+    order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+    results = [None] * len(chunks)
+
+    for batch_start in range(0, len(order), batch_size):
+        batch_indices = order[batch_start:batch_start + batch_size]
+        batch = [chunks[i] for i in batch_indices]
+
+        try:
+            batch_results = nlp(batch, batch_size=len(batch))
+        except Exception as e:
+            print(f"Error in NER for batch: {str(e)}")
+
+            # Retry each chunk on its own so one bad chunk doesn't lose the whole batch
+            batch_results = []
+            for chunk in batch:
+                try:
+                    batch_results.append(nlp(chunk))
+                except Exception as inner_e:
+                    print(f"Error in NER for chunk: {str(inner_e)}")
+                    batch_results.append(None)
+
+        # Put results back in the original chunk order
+        for index, ner_results in zip(batch_indices, batch_results):
+            results[index] = ner_results
+    
+    return results
+
+def process_chunk(chunk, chunk_position, ner_results, mentions):
+    """
+    Process a single chunk (sentence or phrase) and collect its entity mentions
+    for target sentiment analysis
+    
+    Args:
+        chunk: Text chunk to process
+        chunk_position: Exact position of this chunk in its sentence
+        ner_results: Named entities found in this chunk by the NER pipeline, None if NER failed
+        mentions: List to store entity mentions with their positions and context
+    """
+    # Skip chunks where NER failed
+    if ner_results is None:
         return
     
     # Process each entity in this chunk
     for entity in ner_results:
-        entity_text = entity['word']
-        
         # Only process if it's a person (PER), organisation (ORG), location (LOC), or miscellaneous (MISC)
         if entity['entity_group'] not in ['PER', 'ORG', 'LOC', 'MISC']:
             continue
@@ -477,49 +1603,97 @@ def process_chunk(chunk, chunk_position, nlp, tsc, entity_sentiments, entity_dat
         # Skip invalid entities
         if chunk_start is None or chunk_end is None or chunk_start >= chunk_end:
             continue
-            
-        # Calculate positions in the original text
-        global_start = chunk_position + chunk_start
-        global_end = chunk_position + chunk_end
 
-        # Verify that the extracted text matches between chunk and original text
-        chunk_entity = chunk[chunk_start:chunk_end]
+        # Store the mention with its position in the sentence and context for sentiment analysis
+        mentions.append({
+            'entity': chunk[chunk_start:chunk_end],
+            'entity_type': entity['entity_group'],
+            'start': chunk_position + chunk_start,
+            'end': chunk_position + chunk_end,
+            'left_context': chunk[:chunk_start],
+            'right_context': chunk[chunk_end:]
+        })
+
+def classify_targets_batched(targets, tsc, batch_size=None):
+    """
+    Classify the sentiment towards a list of targets in batches
+    
+    Args:
+        targets: List of (left_context, target, right_context) tuples
+        tsc: Target sentiment classifier
+        batch_size: Number of targets per batch, defaults to TSC_BATCH_SIZE
         
-        # Get context for sentiment analysis
-        left_context = chunk[:chunk_start]
-        target = chunk_entity
-        right_context = chunk[chunk_end:]
+    Returns:
+        List of (sentiment_label, confidence) tuples in the same order as targets,
+        None for any target that failed
+    """
+    if batch_size is None:
+        batch_size = TSC_BATCH_SIZE
+    batch_size = max(1, batch_size)
+
+    results = []
+    for batch_start in range(0, len(targets), batch_size):
+        batch = targets[batch_start:batch_start + batch_size]
 
         try:
-            # Get sentiment for this entity
-            sentiment_result = tsc.infer_from_text(left_context, target, right_context)
-            sentiment_label = sentiment_result[0]['class_label']
-            confidence = sentiment_result[0]['class_prob']
-        except Exception as inner_e:
-            print(f"Error in sentiment analysis for entity '{target}': {str(inner_e)}")
-            sentiment_label = "neutral"
-            confidence = 0.5
-
-        # Store entity info with global position
-        entity_data_all.append((chunk_entity, global_start, global_end, sentiment_label, confidence))
-
-        # Store in results dictionary
-        entity_key = chunk_entity
-        if entity_key not in entity_sentiments:
-            entity_sentiments[entity_key] = {
-                'sentiment': sentiment_label,
-                'confidence': confidence,
-                'entity_type': entity['entity_group'],
-                'occurrences': 1
-            }
-        else:
-            # Update existing entity information
-            current = entity_sentiments[entity_key]
-            # If this occurrence has higher confidence, update the sentiment
-            if confidence > current['confidence']:
-                current['sentiment'] = sentiment_label
-                current['confidence'] = confidence
-            current['occurrences'] = current.get('occurrences', 0) + 1
+            batch_results = tsc.infer(targets=batch, batch_size=len(batch), disable_tqdm=True)
+
+            # Make sure we got one ranked list of classes back per target
+            if len(batch_results) != len(batch) or not all(r and 'class_label' in r[0] for r in batch_results):
+                raise ValueError("unexpected result shape from batched inference")
+            
+            results.extend((r[0]['class_label'], r[0]['class_prob']) for r in batch_results)
+            continue
+        except Exception as e:
+            if len(batch) > 1:
+                print(f"Error in batched sentiment analysis, classifying targets one by one: {str(e)}")
+
+        # Classify each target on its own so a failure only affects that target
+        for left_context, target, right_context in batch:
+            try:
+                sentiment_result = tsc.infer_from_text(left_context, target, right_context)
+                results.append((sentiment_result[0]['class_label'], sentiment_result[0]['class_prob']))
+            except Exception as inner_e:
+                print(f"Error in sentiment analysis for entity '{target}': {str(inner_e)}")
+                results.append(None)
+    
+    return results
+
+def add_entity_sentiment(mention, sentence_position, entity_sentiments, entity_data_all):
+    """
+    Add a classified entity mention to the overall data structures
+    
+    Args:
+        mention: Entity from analyse_sentences, positioned relative to its sentence
+        sentence_position: Exact position of the mention's sentence in the original text
+        entity_sentiments: Dictionary to store entity sentiment information
+        entity_data_all: List to store entity position and sentiment data
+    """
+    entity_key = mention['entity']
+    sentiment_label = mention['sentiment']
+    confidence = mention['confidence']
+
+    # Store entity info with global position
+    global_start = sentence_position + mention['start']
+    global_end = sentence_position + mention['end']
+    entity_data_all.append((entity_key, global_start, global_end, sentiment_label, confidence))
+
+    # Store in results dictionary
+    if entity_key not in entity_sentiments:
+        entity_sentiments[entity_key] = {
+            'sentiment': sentiment_label,
+            'confidence': confidence,
+            'entity_type': mention['entity_type'],
+            'occurrences': 1
+        }
+    else:
+        # Update existing entity information
+        current = entity_sentiments[entity_key]
+        # If this occurrence has higher confidence, update the sentiment
+        if confidence > current['confidence']:
+            current['sentiment'] = sentiment_label
+            current['confidence'] = confidence
+        current['occurrences'] = current.get('occurrences', 0) + 1
 
 def generate_top_entities_report(entity_sentiments):
     """
@@ -567,410 +1741,1450 @@ def generate_entities_html(top_entities):
     if not top_entities:
         return ""
     
-    entities_html = """
-    <div style="margin-bottom: 15px;">
-        <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 5px;">
-        <strong>🔍 TOP ENTITIES:</strong>
-        <label class="switch toggle-section" style="transform: scale(0.7);">
-                <input type="checkbox" checked id="topEntitiesToggle">
-                <span class="slider round"></span>
-        </label>
-        </div>
-        <div class="collapsible-content active" id="topEntitiesContent">
-    """
-    
-    for entity in top_entities:
-        # Determine the colour based on sentiment
-        if entity["sentiment"] == "positive":
-            border_colour = "#90EE90"  # Light green
-            bg_colour = "#90EE90"
-        elif entity["sentiment"] == "negative":
-            border_colour = "#FFB6C1"  # Light pink
-            bg_colour = "#FFB6C1" 
-        else:
-            border_colour = "#F0F8FF"  # Light blue
-            bg_colour = "#A9D0F5"
-        
-        # Calculate confidence percentage for display
-        confidence_pct = f"{entity['confidence'] * 100:.1f}%"
-        confidence_width = f"{entity['confidence'] * 100}%"
-        
-        # Create the entity cards
-        entities_html += f"""
-        <div style="border: 1px solid #ddd; border-left: 5px solid {border_colour}; border-radius: 8px; 
-                  padding: 15px; margin-bottom: 15px; background-color: white; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-            <div style="display: flex; justify-content: space-between; align-items: center;">
-                <h3 style="margin: 0;">{html.escape(entity['name'])}</h3>
-                <span style="display: inline-block; padding: 3px 8px; border-radius: 12px; 
-                           background-color: #f0f0f0; font-size: 0.8em;">{entity['type']}</span>
-            </div>
-            <p style="margin: 8px 0;">Occurrences: {entity['occurrences']}</p>
-            <p style="margin: 8px 0;">Sentiment: {entity['sentiment'].capitalize()}</p>
-            <div style="height: 8px; background-color: #e0e0e0; border-radius: 4px; margin-top: 8px;">
-                <div style="height: 100%; border-radius: 4px; width: {confidence_width}; 
-                          background-color: {bg_colour};"></div>
-            </div>
-            <p style="text-align: right; font-size: 0.8em; margin: 5px 0 0 0;">Confidence: {confidence_pct}</p>
-        </div>
-        """
-    
-    entities_html += """
-        </div>
-    </div>
-    """
-    
-    return entities_html
-
-def get_article_data_from(url):
+    # Each entity card is rendered by the entity_card macro in templates/fragments.html
+    return str(get_template_fragments().top_entities(top_entities))
+
+# URL-level result cache and in-flight computations, shared by all requests in this worker
+_result_cache = OrderedDict()
+_result_inflight = {}
+_result_cache_lock = threading.Lock()
+_result_cache_db = None
+result_cache_stats = {"hits": 0, "joined": 0, "misses": 0}
+
+def canonicalize_url(url):
+    """
+    Normalise an article URL so links to the same article share one result cache entry.
+    Tracking parameters, fragments, AMP variants and trailing slashes are removed
+    
+    Args:
+        url: Article URL as given by the user
+        
+    Returns:
+        Canonical URL string
+    """
+    # Malformed URLs, including ones with a port that isn't a number from 0 to 65535,
+    # are left as they are, the download reports what is wrong with them
     try:
-        initialize_nltk()
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    
+    # Lower-case the host and drop www. and AMP subdomains
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "amp."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+    
+    # Drop AMP path variants, e.g. /story/amp, /amp/story or /story.amp, and map
+    # /story.amp.html to the /story.html it is the AMP version of
+    path = parts.path
+    if path.startswith("/amp/"):
+        path = path[len("/amp"):]
+    for suffix, replacement in (("/amp", ""), ("/amp/", ""), (".amp", ""), (".amp.html", ".html")):
+        if path.endswith(suffix):
+            path = path[:-len(suffix)] + replacement
+            break
+    path = path.rstrip("/") or "/"
+    
+    # Drop tracking parameters and sort the rest so parameter order doesn't matter
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in TRACKING_PARAMS and not key.lower().startswith("utm_")
+    )
+    
+    return urlunsplit((parts.scheme.lower(), host, path, urlencode(query), ""))
+
+def get_result_cache_db():
+    """Open the on-disk result cache, returns None if it is not configured. Call with the cache lock held"""
+    global _result_cache_db
+    if _result_cache_db is None and RESULT_CACHE_PATH:
+        _result_cache_db = sqlite3.connect(RESULT_CACHE_PATH, check_same_thread=False)
+        # Let the other workers read while one of them writes
+        _result_cache_db.execute("PRAGMA journal_mode=WAL")
+        _result_cache_db.execute("CREATE TABLE IF NOT EXISTS results (url TEXT PRIMARY KEY, expires REAL NOT NULL, output TEXT NOT NULL, sentences TEXT)")
+        _result_cache_db.commit()
+    return _result_cache_db
+
+def get_stored_result(key):
+    """
+    Look up an analysed article that another worker stored in the on-disk result cache.
+    Call with the cache lock held
+    
+    Returns:
+        (expiry time, HTML string, per-sentence results or None) tuple, or None if the
+        article is not cached or its entry has expired. The disk cache keeps wall clock
+        times, which all workers share
+    """
+    try:
+        db = get_result_cache_db()
+        row = db.execute("SELECT expires, output, sentences FROM results WHERE url = ? AND expires > ?", (key, time.time())).fetchone() if db else None
+        return (row[0], row[1], json.loads(row[2]) if row[2] else None) if row else None
+    except Exception as e:
+        print(f"Error reading result cache: {str(e)}")
+        return None
+
+def store_result(key, output, sentence_results=None):
+    """Store an analysed article in the on-disk result cache, if configured. Call with the cache lock held"""
+    try:
+        db = get_result_cache_db()
+        if db:
+            now = time.time()
+            db.execute("DELETE FROM results WHERE expires <= ?", (now,))
+            db.execute(
+                "INSERT OR REPLACE INTO results (url, expires, output, sentences) VALUES (?, ?, ?, ?)",
+                (key, now + RESULT_CACHE_TTL, output, json.dumps(sentence_results) if sentence_results is not None else None)
+            )
+            db.commit()
+    except Exception as e:
+        print(f"Error writing result cache: {str(e)}")
+
+def get_article_data_cached(url, progress=None, listener=None):
+    """
+    Get the analysed article HTML for a URL through the result cache, see get_cached_result.
+    The article's per-sentence results are cached with it, so its summary can reuse them
+    
+    Args:
+        url: Article URL
+        progress: Optional progress callable, passed on to get_article_data_from
+        listener: Optional event callable, passed on to get_article_data_from. It is
+            only called if this request runs the analysis, not if the result comes
+            from the cache or from a computation that is already running
         
-        # Get publication details with error checking
-        pub_details = get_publication_details(url)
-        publication_name = pub_details.get('name', 'Unknown')
-        if isinstance(publication_name, dict):
-            # Extract the actual name from the dictionary
-            publication_string = publication_name.get('name', '')
-        else:
-            publication_string = publication_name
-        
-        article = newspaper.Article(url)
-        article.download()
-        article.parse()
-        article.nlp()
-        
-        # Safely get article text and summary
-        article_text = article.text if article.text else "No article text available"
-        article_summary = article.summary if article.summary else "No summary available"
-
-        # Get both highlighted and plain versions of the text
-        highlighted_text, plain_text, entity_sentiments = analyse_sentiment_newssentiment(article_text)
-        highlighted_summary, plain_summary, _ = analyse_sentiment_newssentiment(article_summary)
-
-        # Generate top 5 entities report
-        top_entities = generate_top_entities_report(entity_sentiments)
-
-        # Generate the entities HTML section
-        entities_html = generate_entities_html(top_entities)
-
-        # Filter authors
-        filtered_authors = filter_authors(article.authors, publication_string)
-        
-        # Create the HTML output with error checking for each component
-        output = f"""
-        <div style="font-family: Arial, sans-serif; font-size:20px; max-width: 800px; margin: 20px; line-height: 1.6;">
-            <div style="border-bottom: 2px solid #333; margin-bottom: 15px;">
-                <h2>ARTICLE DETAILS</h2>
-            </div>
-            
-            <div style="margin-bottom: 15px;">
-                <strong>🌐 PUBLICATION:</strong><br>
-                {html.escape(pub_details.get('name', 'Unknown'))}<br>
-            </div>
-
-            <div style="margin-bottom: 15px;">
-                <strong>🗞️ TITLE:</strong><br>
-                <u><a href="{url}" target="_blank">'{html.escape(article.title)}'</a></u><br>
-            </div>
-            
-            <div style="margin-bottom: 15px;">
-                <strong>🖋️ AUTHOR(S):</strong><br>
-                {('<br>'.join(f'• {html.escape(author)}' for author in filtered_authors)) if filtered_authors else 'No authors found'}
-            </div>
-            
-            <div style="margin-bottom: 15px;">
-                <strong>📅 PUBLISH DATE:</strong><br>
-                {format_date(article.publish_date)}
-            </div>
-
-            {entities_html}
-
-            <div style="margin-bottom: 15px;" id="sentiment-controls">
-                <div id="sentiment-legend" style="opacity: 1; margin-bottom: 10px; transition: opacity 0.3s ease;">
-                    <strong>📊 SENTIMENT LEGEND:</strong><br>
-                    <span style="background-color: #90EE90; padding: 0 5px;">Positive</span>
-                    <span style="background-color: #F0F8FF; padding: 0 5px; margin: 0 10px;">Neutral</span>
-                    <span style="background-color: #FFB6C1; padding: 0 5px;">Negative</span>
-                </div>
+    Returns:
+        HTML string, as returned by get_article_data_from
+    """
+    if RESULT_CACHE_TTL <= 0:
+        return get_article_data_from(url, progress, listener)
+    
+    def analyse():
+        sentence_results = {}
+        return get_article_data_from(url, progress, listener, sentence_results), sentence_results
+    
+    return get_cached_result(canonicalize_url(url), analyse)
+
+def get_cached_sentence_results(url):
+    """
+    Return the per-sentence results of an analysed article from the result cache, see
+    analyse_sentiment_newssentiment, or None if the article isn't cached
+    """
+    key = canonicalize_url(url)
+    with _result_cache_lock:
+        entry = _result_cache.get(key)
+        if not (entry and entry[0] > time.monotonic()):
+            entry = get_stored_result(key)
+        # Copy the results, the caller adds its own sentences to them
+        return dict(entry[2]) if entry and entry[2] is not None else None
+
+def get_cached_result(key, compute):
+    """
+    Get a result through the result cache. Concurrent requests for the same key wait on
+    one computation instead of starting their own. If RESULT_CACHE_PATH is set, results
+    computed by the other workers are used too
+    
+    Args:
+        key: Cache key, the canonical URL of an analysed article
+        compute: Callable computing the result if it isn't cached, returning a tuple of
+            (output string, per-sentence results or None). Outputs starting with
+            "Error extracting article" are errors, and aren't cached
+        
+    Returns:
+        Output string
+    """
+    with _result_cache_lock:
+        # Serve from the cache if the entry hasn't expired
+        entry = _result_cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            _result_cache.move_to_end(key)
+            result_cache_stats["hits"] += 1
+            return entry[1]
+        
+        # Then from the other workers' results
+        entry = get_stored_result(key)
+        if entry:
+            result_cache_stats["hits"] += 1
+            return entry[1]
+        
+        # Otherwise join the computation already running for this key, or start one
+        inflight = _result_inflight.get(key)
+        is_owner = inflight is None
+        result_cache_stats["misses" if is_owner else "joined"] += 1
+        if is_owner:
+            inflight = {"event": threading.Event(), "output": "Error extracting article: analysis did not complete"}
+            _result_inflight[key] = inflight
+    
+    if not is_owner:
+        inflight["event"].wait()
+        return inflight["output"]
+    
+    sentence_results = None
+    try:
+        inflight["output"], sentence_results = compute()
+    finally:
+        with _result_cache_lock:
+            # Don't cache errors, the next request should try again
+            if not inflight["output"].startswith("Error extracting article"):
+                _result_cache[key] = (time.monotonic() + RESULT_CACHE_TTL, inflight["output"], sentence_results)
+                _result_cache.move_to_end(key)
+                store_result(key, inflight["output"], sentence_results)
                 
-                <label class="switch">
-                    <input type="checkbox" checked id="sentimentToggle">
-                    <span class="slider round"></span>
-                </label>
-            </div>
-            
-            <div style="margin-bottom: 15px;">
-                <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 5px;">
-                    <strong>📋 SUMMARY:</strong>
-                    <label class="switch toggle-section" style="transform: scale(0.7);">
-                        <input type="checkbox" id="summaryToggle">
-                        <span class="slider round"></span>
-                    </label>
-                </div>
-                <div class="collapsible-content" id="summaryContent">
-                    <div class="text-plain">{plain_summary}</div>
-                    <div class="text-highlighted" style="display: none;">{highlighted_summary}</div>
-                </div>
-            </div>
-
-            <div style="margin-bottom: 15px;">
-                <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 5px;">
-                    <strong>📄 ARTICLE TEXT:</strong>
-                    <label class="switch toggle-section" style="transform: scale(0.7);">
-                        <input type="checkbox" checked id="articleToggle">
-                        <span class="slider round"></span>
-                    </label>
-                </div>
-                <div class="collapsible-content active" id="articleContent">
-                    <div class="text-plain">{plain_text}</div>
-                    <div class="text-highlighted" style="display: none;">{highlighted_text}</div>
-                </div>
-            </div>
-        </div>
-
-        <script>
-        document.addEventListener('DOMContentLoaded', function() {{
-            // Toggle for summary section
-            const summaryToggle = document.getElementById('summaryToggle');
-            const summaryContent = document.getElementById('summaryContent');
-            
-            summaryToggle.addEventListener('change', function() {{
-                if(this.checked) {{
-                    summaryContent.classList.add('active');
-                }} else {{
-                    summaryContent.classList.remove('active');
-                }}
-            }});
-            
-            // Toggle for article text section
-            const articleToggle = document.getElementById('articleToggle');
-            const articleContent = document.getElementById('articleContent');
-            
-            articleToggle.addEventListener('change', function() {{
-                if(this.checked) {{
-                    articleContent.classList.add('active');
-                }} else {{
-                    articleContent.classList.remove('active');
-                }}
-            }});
-
-            // Toggle for top entities section
-            const topEntitiesToggle = document.getElementById('topEntitiesToggle');
-            const topEntitiesContent = document.getElementById('topEntitiesContent');
-            
-            if(topEntitiesToggle && topEntitiesContent) {{
-            topEntitiesToggle.addEventListener('change', function() {{
-                if(this.checked) {{
-                    topEntitiesContent.classList.add('active');
-                }} else {{
-                    topEntitiesContent.classList.remove('active');
-                }}
-            }}); 
-        }}
-        }});
-        </script>
-        """
-        return output
+                # Evict the least recently used entries
+                while len(_result_cache) > RESULT_CACHE_SIZE:
+                    _result_cache.popitem(last=False)
+            del _result_inflight[key]
+        inflight["event"].set()
     
+    return inflight["output"]
+
+# Analysis jobs by id, run on a bounded pool of worker threads
+_jobs = {}
+_jobs_lock = threading.Lock()
+_job_store_db = None
+_job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="analysis")
+
+def get_job_store_db():
+    """Open the on-disk job store, returns None if it is not configured. Call with the jobs lock held"""
+    global _job_store_db
+    if _job_store_db is None and JOB_STORE_PATH:
+        _job_store_db = sqlite3.connect(JOB_STORE_PATH, check_same_thread=False)
+        # Let the other workers read while one of them writes
+        _job_store_db.execute("PRAGMA journal_mode=WAL")
+        _job_store_db.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, finished REAL, job TEXT NOT NULL)")
+        _job_store_db.commit()
+    return _job_store_db
+
+def save_job(job):
+    """Write a job's current state to the on-disk job store, if configured. Call with the jobs lock held"""
+    try:
+        db = get_job_store_db()
+        if db:
+            db.execute("INSERT OR REPLACE INTO jobs (id, finished, job) VALUES (?, ?, ?)", (job["id"], job["finished"], json.dumps(job)))
+            db.commit()
     except Exception as e:
-        print(f"Error in get_article_data_from: {str(e)}")  # For debugging
-        return f"Error extracting article: {str(e)}"
+        print(f"Error writing job store: {str(e)}")
 
-@app.route("/")
-def index():
-    url = request.args.get("url", "")
-    if url:
-        extracted_article_data = get_article_data_from(url)
-    else:
-        extracted_article_data = ""
-    
-    return f"""
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=0.9">
-        <title>Article Bias Indicator</title>
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px;  }}
-
-            /* Animation styles for collapsible sections */
-            .collapsible-content {{
-                max-height: 0;
-                overflow: hidden;
-                transition: max-height 0.5s ease-out, opacity 0.3s ease-out;
-                opacity: 0;
-            }}
-    
-            .collapsible-content.active {{
-                max-height: 10000px; /* Large enough to contain all content */
-                opacity: 1;
-                transition: max-height 0.5s ease-in, opacity 0.5s ease-in;
-            }}
-
-            /* Loading bar styles */
-            .loader {{
-                border: 16px solid #f3f3f3;
-                border-radius: 50%;
-                border-top: 16px solid #4CAF50;
-                width: 80px;
-                height: 80px;
-                animation: spin 2s linear infinite;
-                margin: 20px auto;
-                display: none;
-            }}
-            
-            @keyframes spin {{
-                0% {{ transform: rotate(0deg); }}
-                100% {{ transform: rotate(360deg); }}
-            }}
-            
-            /* Toggle Switch Styles */
-            .switch {{
-                position: relative;
-                display: inline-block;
-                width: 60px;
-                height: 33px;
-            }}
-            
-            .switch input {{
-                opacity: 0;
-                width: 0;
-                height: 0;
-            }}
-            
-            .slider {{
-                position: absolute;
-                cursor: pointer;
-                top: 0;
-                left: 0;
-                right: 0;
-                bottom: 0;
-                background-color: #ccc;
-                transition: .4s;
-            }}
-            
-            .slider:before {{
-                position: absolute;
-                content: "";
-                height: 26px;
-                width: 26px;
-                left: 4px;
-                bottom: 4px;
-                background-color: white;
-                transition: .4s;
-            }}
-            
-            input:checked + .slider {{
-                background-color: #4CAF50;
-            }}
-            
-            input:checked + .slider:before {{
-                transform: translateX(26px);
-            }}
-            
-            .slider.round {{
-                border-radius: 34px;
-            }}
-            
-            .slider.round:before {{
-                border-radius: 50%;
-            }}
-
-            .fade-in {{
-                transition: opacity 0.5s ease-in-out;
-            }}
-
-            .visible {{
-                opacity: 1 !important;
-            }}
-            
-        </style>
-
-        <script>
-                // Sentiment Toggle switch
-                document.addEventListener('DOMContentLoaded', function() {{
-                    const toggle = document.getElementById('sentimentToggle');
-                    if (toggle) {{
-                        toggle.addEventListener('change', function() {{
-                            const legend = document.getElementById('sentiment-legend');
-                            const plainTexts = document.getElementsByClassName('text-plain');
-                            const highlightedTexts = document.getElementsByClassName('text-highlighted');
-                            
-                            // Toggle legend opacity
-                            legend.style.opacity = this.checked ? '1' : '0.3';
-                            
-                            // Toggle text versions
-                            for (let text of plainTexts) {{
-                                text.style.display = this.checked ? 'block' : 'none';
-                            }}
-                            for (let text of highlightedTexts) {{
-                                text.style.display = this.checked ? 'none' : 'block';
-                            }}
-                        }});
-                    }}
-                    
-                    // Handle form submission with loading animation
-                    const form = document.getElementById('analysisForm');
-                    if (form) {{
-                        form.addEventListener('submit', function(e) {{
-                            showLoader();
-                        }});
-                    }}
-                    
-                    // Auto show results if URL is already in the form
-                    const url = document.getElementById('url').value;
-                    if (url) {{
-                        const results = document.getElementById('results');
-                        if (results) {{
-                            setTimeout(function() {{
-                                results.classList.add('visible');
-                            }}, 300);
-                        }}
-                    }}
-                }});
-                
-                // Back to top button functionality
-                window.onscroll = function() {{
-                    const mybutton = document.getElementById("backToTopBtn");
-                    if (document.body.scrollTop > 20 || document.documentElement.scrollTop > 20) {{
-                        mybutton.style.display = "block";
-                    }} else {{
-                        mybutton.style.display = "none";
-                    }}
-                }};
-
-                // Show loading indicator and hide results
-                function showLoader() {{
-                    document.getElementById("loader").style.display = "block";
-                    const results = document.getElementById("results");
-                    if (results) {{
-                        results.classList.remove('visible');
-                    }}
-                    return true;
-                }}
-        </script>
-    </head>
-    <body style="background-color: navajowhite; display: flex; flex-direction: column; align-items: center; text-align: justify; justify-content: center; min-height: 100vh; margin: 0; font-family: Arial, sans-serif;">
-            <div style="text-align: center; max-width: 600px; padding: 10px;"
-            <p>This tool detects <b>sentiment</b> in news articles, indicating an author’s bias for or against a given subject. It can show positive, neutral, or negative sentiment towards people, locations, and organisations. <b>It will occasionally make mistakes</b> and is intended only as a starting point to get you thinking about author bias.<br>Created by Alexander Broad <a href="https://github.com/AlexanderBroad/DissProject" target="_blank">(GitHub repository)</a></p>
-            </div>
-            <form id="analysisForm" action="" method="get" style="width: 100%; max-width: 600px; margin: 20px; text-align: center; line-height: 1.6;">
-                <label for="url"><strong>ENTER ARTICLE URL BELOW:</strong></label><br>
-                <input type="url" id="url" name="url" value="{url}" style="width: 100%; padding: 10px; margin: 20px 0; strong;"><br>
-                <input type="submit" value="ANALYSE ARTICLE" style="padding: 10px; background-color: #4CAF50; color: black; border: 3px black; cursor: pointer;">
-            </form>
-
-            <div id="loader" class="loader"></div>
-
-            <div id="results" class="fade-in" style="width: 100%; max-width: 800px; margin: 20px; opacity: 0;">
-                {extracted_article_data}
-            </div>
-
-            <button onclick="window.scrollTo({{ top: 0, behavior: 'smooth' }})" id="backToTopBtn" style="position: fixed; bottom: 20px; right: 20px; padding: 10px 15px; background-color: #555; color: white; border: none; border-radius: 4px; cursor: pointer; display: none;">Back to Top</button>
-      
-    </body>
-    </html>
+def get_job(job_id):
+    """
+    Look up a job started by this worker, or by another worker through the on-disk job store.
+    Call with the jobs lock held
+    
+    Returns:
+        Job dictionary, or None if there is no such job or its result has expired
+    """
+    if job_id in _jobs:
+        return _jobs[job_id]
+    
+    try:
+        db = get_job_store_db()
+        row = db.execute("SELECT job FROM jobs WHERE id = ? AND (finished IS NULL OR finished > ?)",
+                         (job_id, time.time() - JOB_TTL)).fetchone() if db else None
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        print(f"Error reading job store: {str(e)}")
+        return None
+
+def forget_expired_jobs(now):
+    """Forget finished jobs once their results have expired. Call with the jobs lock held"""
+    for job_id in [job_id for job_id, job in _jobs.items() if job["finished"] and now - job["finished"] > JOB_TTL]:
+        del _jobs[job_id]
+    
+    try:
+        db = get_job_store_db()
+        if db:
+            db.execute("DELETE FROM jobs WHERE finished < ?", (now - JOB_TTL,))
+            db.commit()
+    except Exception as e:
+        print(f"Error writing job store: {str(e)}")
+
+def submit_analysis_job(url, listener=None):
+    """
+    Queue an article for analysis on the job worker pool
+    
+    Args:
+        url: Article URL
+        listener: Optional event callable, see run_analysis_job
+        
+    Returns:
+        The new job dictionary, or None if the queue is full
     """
+    job = create_job(url)
+    if job is not None:
+        _job_executor.submit(run_analysis_job, job, listener)
+    return job
 
-if __name__ == "__main__":
-    app.run(host='0.0.0.0')
\ No newline at end of file
+def submit_batch_job(urls):
+    """
+    Queue a batch analysis of several articles on the job worker pool, see analyse_articles
+    
+    Args:
+        urls: List of article URLs
+        
+    Returns:
+        The new job dictionary, or None if the queue is full
+    """
+    job = create_job(None, urls)
+    if job is not None:
+        _job_executor.submit(run_batch_job, job)
+    return job
+
+def submit_summary_job(url):
+    """
+    Queue the summary of an article on the job worker pool, see get_article_summary
+    
+    Args:
+        url: Article URL
+        
+    Returns:
+        The new job dictionary, or None if the queue is full
+    """
+    job = create_job(url)
+    if job is not None:
+        _job_executor.submit(run_summary_job, job)
+    return job
+
+def create_job(url, urls=None):
+    """
+    Add a queued job, unless too many jobs are already waiting or running. The limit
+    applies to each worker process, which runs its own jobs
+    
+    Args:
+        url: Article URL of an analysis job, None for a batch job
+        urls: List of article URLs of a batch job
+        
+    Returns:
+        The new job dictionary, or None if the queue is full
+    """
+    now = time.time()
+    
+    with _jobs_lock:
+        forget_expired_jobs(now)
+        
+        # Reject the job if too many are already waiting or running
+        if sum(1 for job in _jobs.values() if not job["finished"]) >= JOB_QUEUE_LIMIT:
+            return None
+        
+        job = {
+            "id": uuid.uuid4().hex,
+            "url": url,
+            "urls": urls,
+            "status": "queued",
+            "progress": {"processed": 0, "total": 0},
+            "result": None,
+            "error": None,
+            "created": now,
+            "started": None,
+            "finished": None
+        }
+        _jobs[job["id"]] = job
+        save_job(job)
+    
+    return job
+
+def run_analysis_job(job, listener=None):
+    """
+    Run an analysis job on a worker thread, recording its progress and result
+    
+    Args:
+        job: Job dictionary, see submit_analysis_job
+        listener: Optional callable, called with each (event, data) of the analysis as
+            it runs (see get_article_data_from), then with ("finished", output HTML)
+    """
+    def update_progress(processed, total):
+        with _jobs_lock:
+            job["progress"] = {"processed": processed, "total": total}
+            save_job(job)
+    
+    with _jobs_lock:
+        job["status"] = "running"
+        job["started"] = time.time()
+        save_job(job)
+    
+    try:
+        output = get_article_data_cached(job["url"], update_progress, listener)
+    except Exception as e:
+        output = f"Error extracting article: {str(e)}"
+    
+    with _jobs_lock:
+        if output.startswith("Error extracting article"):
+            job["status"] = "error"
+            job["error"] = output
+        else:
+            job["status"] = "done"
+            job["result"] = output
+        job["finished"] = time.time()
+        save_job(job)
+    
+    if listener:
+        listener("finished", output)
+
+def run_batch_job(job):
+    """Run a batch analysis job on a worker thread, recording its result"""
+    with _jobs_lock:
+        job["status"] = "running"
+        job["started"] = time.time()
+        save_job(job)
+    
+    try:
+        result, error = analyse_articles(job["urls"]), None
+    except Exception as e:
+        print(f"Error in run_batch_job: {str(e)}")  # For debugging
+        result, error = None, f"Error analysing articles: {str(e)}"
+    
+    with _jobs_lock:
+        job["status"] = "error" if error else "done"
+        job["result"] = result
+        job["error"] = error
+        job["finished"] = time.time()
+        save_job(job)
+
+def run_summary_job(job):
+    """Run a summary job on a worker thread, recording its result"""
+    with _jobs_lock:
+        job["status"] = "running"
+        job["started"] = time.time()
+        save_job(job)
+    
+    output = get_article_summary_cached(job["url"])
+    
+    with _jobs_lock:
+        if output.startswith("Error extracting article"):
+            job["status"] = "error"
+            job["error"] = output
+        else:
+            job["status"] = "done"
+            job["result"] = output
+        job["finished"] = time.time()
+        save_job(job)
+
+def get_article_data_from(url, progress=None, listener=None, sentence_results=None):
+    """
+    Download, analyse and render an article as HTML
+    
+    Args:
+        url: Article URL
+        progress: Optional callable, called with the number of article sentences
+            analysed so far and the total number of sentences
+        listener: Optional callable, called with each (event, data) of iter_article_events
+            as soon as it is ready, so the results can be streamed
+        sentence_results: Optional dictionary the article's per-sentence results are
+            added to, see analyse_sentiment_newssentiment
+    """
+    stats = new_article_stats()
+    
+    try:
+        started = time.perf_counter()
+        details = None
+        highlighted_parts = []
+        top_entities = []
+        
+        for event, data in iter_article_events(url, stats, sentence_results):
+            if listener:
+                listener(event, data)
+            
+            if event == "details":
+                details = data
+            elif event == "sentences":
+                highlighted_parts.append(data["highlighted"])
+                if progress:
+                    progress(data["processed"], data["total"])
+            elif event == "entities":
+                top_entities = data["top_entities"]
+
+        with time_stage(stats, "render"):
+            # Generate the entities HTML section
+            entities_html = generate_entities_html(top_entities)
+            
+            page_html = render_article_html(details, entities_html, highlighted_parts)
+        
+        stats["stages"]["total"] = time.perf_counter() - started
+        record_article_metrics(url, stats)
+        return page_html
+    
+    except Exception as e:
+        print(f"Error in get_article_data_from: {str(e)}")  # For debugging
+        record_article_error()
+        return f"Error extracting article: {str(e)}"
+
+def iter_article_events(url, stats=None, sentence_results=None):
+    """
+    Download and analyse an article, yielding each part of the results as soon as it is ready
+    
+    Args:
+        url: Article URL
+        stats: Optional article stats to record stage timings and counts in, see new_article_stats
+        sentence_results: Optional dictionary the per-sentence results are added to,
+            see analyse_sentiment_newssentiment
+        
+    Yields:
+        (event, data) tuples, in this order:
+        "details" once the article is parsed, with its URL, publication, title, authors and publish date,
+        "sentences" for each analysed batch of sentences, see iter_sentiment_batches,
+        "entities" with the top entities report. The summary isn't part of the analysis,
+        the page asks for it from /summary when it is opened, see get_article_summary
+    """
+    initialize_nltk()
+    
+    article, details = fetch_article(url, stats=stats)
+    yield "details", details
+    
+    # Safely get article text
+    article_text = article.text if article.text else "No article text available"
+    
+    # Get the highlighted text, batch by batch
+    entity_sentiments = {}
+    sent_text = False
+    try:
+        for batch in iter_sentiment_batches(article_text, sentence_results, stats=stats):
+            entity_sentiments = batch["entity_sentiments"]
+            sent_text = True
+            yield "sentences", batch
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Error in analyze_entity_sentiments: {str(e)}")
+        
+        # Fall back to the plain text if the analysis failed before any of it was shown
+        if not sent_text:
+            escaped_text = html.escape(article_text)
+            yield "sentences", {"processed": 0, "total": 0, "highlighted": escaped_text, "entity_sentiments": {}}
+    
+    # Generate top 5 entities report
+    yield "entities", {"top_entities": generate_top_entities_report(entity_sentiments)}
+
+# Keep-alive HTTP sessions by host, and the cache of downloaded pages, shared by all requests in this worker
+_download_sessions = OrderedDict()
+_download_sessions_lock = threading.Lock()
+_download_cache = OrderedDict()
+_download_cache_lock = threading.Lock()
+_download_cache_db = None
+download_cache_stats = {"fresh_hits": 0, "revalidated": 0, "misses": 0}
+
+def get_download_session(host):
+    """
+    Return the keep-alive HTTP session for a host, creating it if needed. Only the
+    DOWNLOAD_SESSIONS most recently used hosts keep their sessions and connections open
+    """
+    with _download_sessions_lock:
+        session = _download_sessions.get(host)
+        if session is not None:
+            _download_sessions.move_to_end(host)
+        else:
+            import newspaper
+            session = requests.Session()
+            session.headers["User-Agent"] = newspaper.Config().browser_user_agent
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(JOB_WORKERS, BATCH_DOWNLOAD_WORKERS))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _download_sessions[host] = session
+            
+            # Close the sessions of the least recently used hosts. A download still using
+            # one of them finishes, its connection is closed instead of kept for reuse
+            while len(_download_sessions) > max(1, DOWNLOAD_SESSIONS):
+                _download_sessions.popitem(last=False)[1].close()
+        return session
+
+def get_download_cache_db():
+    """Open the on-disk download cache, returns None if it is not configured. Call with the cache lock held"""
+    global _download_cache_db
+    if _download_cache_db is None and DOWNLOAD_CACHE_PATH:
+        _download_cache_db = sqlite3.connect(DOWNLOAD_CACHE_PATH, check_same_thread=False)
+        _download_cache_db.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+        _download_cache_db.commit()
+    return _download_cache_db
+
+def get_cached_download(url):
+    """
+    Look up a downloaded page in the memory cache, then the disk cache
+    
+    Returns:
+        Dictionary with the page's HTML, ETag, Last-Modified and expiry time, or None if it is not cached
+    """
+    try:
+        with _download_cache_lock:
+            if url in _download_cache:
+                _download_cache.move_to_end(url)
+                return _download_cache[url]
+            
+            db = get_download_cache_db()
+            row = db.execute("SELECT entry FROM pages WHERE url = ?", (url,)).fetchone() if db else None
+            return json.loads(row[0]) if row else None
+    except Exception as e:
+        print(f"Error reading download cache: {str(e)}")
+        return None
+
+def store_cached_download(url, entry):
+    """Store a downloaded page in the memory cache and, if configured, the disk cache"""
+    try:
+        with _download_cache_lock:
+            if DOWNLOAD_CACHE_SIZE > 0:
+                _download_cache[url] = entry
+                _download_cache.move_to_end(url)
+                
+                # Evict least recently used pages
+                while len(_download_cache) > DOWNLOAD_CACHE_SIZE:
+                    _download_cache.popitem(last=False)
+            
+            db = get_download_cache_db()
+            if db:
+                db.execute("INSERT OR REPLACE INTO pages (url, entry) VALUES (?, ?)", (url, json.dumps(entry)))
+                db.commit()
+    except Exception as e:
+        print(f"Error writing download cache: {str(e)}")
+
+def download_html(url):
+    """
+    Download an article page over a keep-alive session for its host, with connect, read
+    and total timeouts and a size limit. Pages are cached, and a cached page is reused while
+    its Cache-Control max-age lasts, then revalidated with a conditional request using
+    its ETag or Last-Modified date
+    
+    Args:
+        url: Article URL
+        
+    Returns:
+        HTML of the page as a string
+    """
+    cached = get_cached_download(url)
+    if cached and cached["expires"] > time.time():
+        download_cache_stats["fresh_hits"] += 1
+        return cached["html"]
+    
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    
+    session = get_download_session(urlsplit(url).netloc.lower())
+    deadline = time.monotonic() + DOWNLOAD_TOTAL_TIMEOUT
+    with session.get(url, headers=headers, timeout=(DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT), stream=True) as response:
+        if response.status_code == 304 and cached:
+            download_cache_stats["revalidated"] += 1
+            page_html = cached["html"]
+        else:
+            if response.status_code >= 400:
+                raise Exception(f"Download failed with status code {response.status_code} for {url}")
+            
+            # Stop reading pages that are larger than the limit
+            if int(response.headers.get("Content-Length") or 0) > DOWNLOAD_MAX_BYTES:
+                raise Exception(f"Article page is larger than {DOWNLOAD_MAX_BYTES} bytes")
+            content = read_download(response, url, deadline)
+            
+            download_cache_stats["misses"] += 1
+            page_html = decode_html(content, response)
+        
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if "no-store" in cache_control:
+            return page_html
+        
+        # Reuse the page without asking again while the publisher says it is fresh
+        max_age = re.search(r'max-age=(\d+)', cache_control)
+        fresh_for = int(max_age.group(1)) if max_age and "no-cache" not in cache_control else 0
+        
+        store_cached_download(url, {
+            "html": page_html,
+            "etag": response.headers.get("ETag") or (cached or {}).get("etag"),
+            "last_modified": response.headers.get("Last-Modified") or (cached or {}).get("last_modified"),
+            "expires": time.time() + fresh_for
+        })
+    
+    return page_html
+
+def read_download(response, url, deadline):
+    """
+    Read the body of a streamed download, up to DOWNLOAD_MAX_BYTES and until a deadline.
+    The read timeout only covers the gap between bytes, so a publisher trickling its page
+    would keep a read going indefinitely. Instead the connection is shut down from a timer
+    when the deadline passes, which ends any read waiting on it
+    
+    Args:
+        response: Streamed requests Response
+        url: Article URL, for the error message
+        deadline: time.monotonic() time the download has to finish by
+        
+    Returns:
+        Body of the response as bytes
+    """
+    timed_out = threading.Event()
+    
+    def abort():
+        timed_out.set()
+        try:
+            response.raw.connection.sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            response.close()
+    
+    timer = threading.Timer(max(0.0, deadline - time.monotonic()), abort)
+    timer.daemon = True
+    timer.start()
+    
+    content = bytearray()
+    try:
+        for block in response.iter_content(64 * 1024):
+            content += block
+            if len(content) > DOWNLOAD_MAX_BYTES:
+                raise Exception(f"Article page is larger than {DOWNLOAD_MAX_BYTES} bytes")
+    except Exception:
+        if not timed_out.is_set():
+            raise
+    finally:
+        timer.cancel()
+    
+    # A shut down connection can look like the end of the page, so don't keep what was read
+    if timed_out.is_set():
+        raise Exception(f"Download took longer than {DOWNLOAD_TOTAL_TIMEOUT:g} seconds for {url}")
+    return bytes(content)
+
+def decode_html(content, response):
+    """Decode a downloaded page using the charset from its headers, falling back to UTF-8 and then a guess"""
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        try:
+            return content.decode(response.encoding, errors="replace")
+        except LookupError:
+            pass
+    
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        guessed = chardet.detect(content)["encoding"] if chardet else None
+        return content.decode(guessed or "latin-1", errors="replace")
+
+def fetch_article(url, input_html=None, stats=None):
+    """
+    Download and parse an article
+    
+    Args:
+        url: Article URL
+        input_html: Optional HTML of the article, e.g. from a saved page. If given, the
+            article isn't downloaded, and its publication is taken from its canonical link
+        stats: Optional article stats to record the download and parse times in
+        
+    Returns:
+        Tuple of (parsed newspaper Article, dictionary with the article's URL,
+        publication, title, authors and publish date)
+    """
+    import newspaper
+    
+    article = newspaper.Article(url)
+    if input_html is None:
+        with time_stage(stats, "download"):
+            article.download(input_html=download_html(url))
+    else:
+        article.download(input_html=input_html)
+    
+    with time_stage(stats, "parse"):
+        # Skip newspaper's content extraction when the page describes itself
+        structured = extract_structured_article(article.html) if EXTRACTION_MODE == "fast" else None
+        if structured:
+            article.title = structured["title"]
+            article.text = structured["text"]
+            article.authors = structured["authors"]
+            article.publish_date = structured["publish_date"]
+            article.canonical_link = structured["url"]
+        else:
+            article.parse()
+    
+    # Get publication details with error checking
+    pub_details = get_publication_details(article.canonical_link or url if input_html is not None else url)
+    publication_name = pub_details.get('name', 'Unknown')
+    if isinstance(publication_name, dict):
+        # Extract the actual name from the dictionary
+        publication_string = publication_name.get('name', '')
+    else:
+        publication_string = publication_name
+    
+    details = {
+        "url": url,
+        "publication": pub_details.get('name', 'Unknown'),
+        "title": article.title,
+        "authors": filter_authors(article.authors, publication_string),
+        "publish_date": format_date(article.publish_date)
+    }
+    
+    return article, details
+
+def extract_structured_article(page_html):
+    """
+    Extract an article from the schema.org JSON-LD data publishers embed in their pages
+    
+    Args:
+        page_html: HTML of the article page
+        
+    Returns:
+        Dictionary with the article's title, text, authors, publish date and canonical URL,
+        or None if the page has no news article data with a headline and body
+    """
+    import lxml.html
+    
+    try:
+        doc = lxml.html.fromstring(page_html)
+    except Exception:
+        return None
+    
+    for script in doc.xpath('//script[@type="application/ld+json"]'):
+        try:
+            data = json.loads(script.text or "")
+        except ValueError:
+            continue
+        
+        # JSON-LD can hold one item, a list of items or a graph of items
+        items = data if isinstance(data, list) else data.get("@graph", [data]) if isinstance(data, dict) else []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            
+            # Types are names, but pages can have anything here, so only strings are kept
+            item_types = item.get("@type")
+            item_types = {item_type for item_type in (item_types if isinstance(item_types, list) else [item_types]) if isinstance(item_type, str)}
+            headline, body = item.get("headline"), item.get("articleBody")
+            if not item_types & STRUCTURED_ARTICLE_TYPES or not isinstance(headline, str) or not isinstance(body, str) or not body.strip():
+                continue
+            
+            # Authors can be names, or people and organisations with names. Anything else is skipped
+            authors = item.get("author") or []
+            if not isinstance(authors, list):
+                authors = [authors]
+            authors = [author.get("name") if isinstance(author, dict) else author for author in authors]
+            authors = [author for author in authors if isinstance(author, str)]
+            
+            try:
+                publish_date = datetime.fromisoformat(item.get("datePublished", "").replace("Z", "+00:00"))
+            except (AttributeError, ValueError):
+                publish_date = None
+            
+            return {
+                "title": html.unescape(headline).strip(),
+                "text": html.unescape(body).strip(),
+                "authors": [author.strip() for author in authors if author.strip()],
+                "publish_date": publish_date,
+                "url": item.get("url") if isinstance(item.get("url"), str) else ""
+            }
+    
+    return None
+
+def summarise_article(article):
+    """
+    Summarise an article with newspaper's summariser. This gives the same summary as
+    article.nlp(), without also extracting keywords, which aren't used
+    
+    Args:
+        article: Parsed newspaper Article
+        
+    Returns:
+        Summary made of sentences from the article text, one per line
+    """
+    import newspaper.nlp
+    from newspaper.text import StopWords
+    
+    summary_sentences = newspaper.nlp.summarize(
+        title=article.title,
+        text=article.text,
+        stopwords=StopWords(article.config.language),
+        max_sents=article.config.max_summary_sent
+    )
+    return "\n".join(summary_sentences)
+
+def get_article_summary(url):
+    """
+    Summarise an article and highlight the entities in the summary, for the summary
+    section of the results page, which only asks for it when the section is opened.
+    The summary is made of sentences from the article text, so it reuses the article's
+    per-sentence results from the result cache, and the page is usually still in the
+    download cache
+    
+    Args:
+        url: Article URL
+        
+    Returns:
+        Highlighted HTML version of the summary, or an error message starting with
+        "Error extracting article"
+    """
+    try:
+        initialize_nltk()
+        article, _ = fetch_article(url)
+        article_summary = summarise_article(article) or "No summary available"
+        highlighted_summary, _ = analyse_sentiment_newssentiment(article_summary, get_cached_sentence_results(url))
+        return highlighted_summary
+    except Exception as e:
+        print(f"Error in get_article_summary: {str(e)}")  # For debugging
+        return f"Error extracting article: {str(e)}"
+
+def get_article_summary_cached(url):
+    """Get an article's highlighted summary through the result cache, see get_article_summary"""
+    if RESULT_CACHE_TTL <= 0:
+        return get_article_summary(url)
+    
+    def summarise():
+        return get_article_summary(url), None
+    
+    return get_cached_result("summary:" + canonicalize_url(url), summarise)
+
+def download_article_for_batch(url):
+    """
+    Download and parse an article for analyse_articles
+    
+    Args:
+        url: Article URL
+        
+    Returns:
+        Dictionary with the article details and its text, or with an error message
+        if the article couldn't be extracted
+    """
+    try:
+        article, details = fetch_article(url)
+        details["text"] = article.text if article.text else "No article text available"
+        return details
+    except Exception as e:
+        print(f"Error in download_article_for_batch: {str(e)}")  # For debugging
+        return {"url": url, "error": f"Error extracting article: {str(e)}"}
+
+def analyse_articles(urls):
+    """
+    Analyse several articles together, e.g. different outlets' coverage of one story.
+    Articles are downloaded in parallel, and the sentences of all of them are run
+    through the models in shared batches
+    
+    Args:
+        urls: List of article URLs
+        
+    Returns:
+        Dictionary with "articles", a list with the details, summary URL (see /summary) and
+        top entities report of each article (or its error), and "comparison", see compare_article_entities
+    """
+    initialize_nltk()
+    
+    # Download and parse the articles concurrently, keeping them in the order given
+    with ThreadPoolExecutor(max_workers=min(BATCH_DOWNLOAD_WORKERS, len(urls)) or 1,
+                            thread_name_prefix="batch-download") as executor:
+        articles = list(executor.map(download_article_for_batch, urls))
+    
+    # Pool the sentences of every article, so the models see full batches
+    # and sentences shared between articles (e.g. quotes or agency copy) run only once.
+    # Packed NER reads sentences in the order of their own article, so with it each
+    # article is analysed on its own
+    sentence_results = {}
+    if NER_PACKING != "packed":
+        pooled_sentences = {}
+        for article in articles:
+            if "error" not in article:
+                for _, _, sentence in iter_sentence_spans(article["text"]):
+                    pooled_sentences[sentence] = None
+        sentence_results = analyse_sentences(list(pooled_sentences))
+    
+    # Build each article's report from the shared results, without running the models again
+    for article in articles:
+        if "error" in article:
+            continue
+        
+        article_results = {} if NER_PACKING == "packed" else sentence_results
+        try:
+            # Only the entities are reported, so the highlighted text isn't rendered
+            entity_sentiments = get_entity_sentiments(article.pop("text"), article_results)
+        except Exception as e:
+            print(f"Error in analyse_articles: {str(e)}")  # For debugging
+            entity_sentiments = {}
+        # Summaries are only made for the articles a client asks for
+        article["summary_url"] = "/summary?" + urlencode({"url": article["url"]})
+        article["top_entities"] = generate_top_entities_report(entity_sentiments)
+    
+    return {"articles": articles, "comparison": compare_article_entities(articles)}
+
+def compare_article_entities(articles):
+    """
+    Compare how articles cover the entities in their top entities reports
+    
+    Args:
+        articles: List of analysed articles, as returned by analyse_articles
+        
+    Returns:
+        List of dictionaries, one per entity found in any article's top entities, with
+        the entity's name and type, the number of articles it is a top entity of, its total
+        occurrences, and its occurrences, sentiment and confidence in each of those articles.
+        Entities covered by the most articles come first
+    """
+    comparison = {}
+    
+    for article in articles:
+        for entity in article.get("top_entities", []):
+            entry = comparison.setdefault(entity["name"], {
+                "name": entity["name"],
+                "type": entity["type"],
+                "articles": 0,
+                "occurrences": 0,
+                "sentiment_counts": {"positive": 0, "neutral": 0, "negative": 0},
+                "coverage": []
+            })
+            entry["articles"] += 1
+            entry["occurrences"] += entity["occurrences"]
+            entry["sentiment_counts"][entity["sentiment"]] = entry["sentiment_counts"].get(entity["sentiment"], 0) + 1
+            entry["coverage"].append({
+                "url": article["url"],
+                "publication": article["publication"],
+                "occurrences": entity["occurrences"],
+                "sentiment": entity["sentiment"],
+                "confidence": entity["confidence"]
+            })
+    
+    return sorted(comparison.values(), key=lambda entry: (entry["articles"], entry["occurrences"]), reverse=True)
+
+def get_stream_payload(event, data):
+    """
+    Turn an event of iter_article_events into the data sent to the page for it. Called
+    on the analysis thread, while the event's data is still current
+    
+    Args:
+        event: Event name
+        data: Event data
+        
+    Returns:
+        Dictionary to send as the event's JSON data
+    """
+    if event == "details":
+        # Send the page with the article details filled in and its other sections empty
+        return {"html": render_article_html(data, '<div id="topEntities"></div>', [])}
+    if event == "sentences":
+        return {
+            "processed": data["processed"],
+            "total": data["total"],
+            "highlighted": data["highlighted"],
+            "top_entities": generate_top_entities_report(data["entity_sentiments"])
+        }
+    if event == "entities":
+        return {"html": generate_entities_html(data["top_entities"])}
+    return data
+
+def iter_article_stream(events):
+    """
+    Stream the analysis of an article as server-sent events, so the page can show
+    each part as soon as it is ready. The analysis runs as a job on the job worker
+    pool (see stream), this only sends on what it puts in the queue
+    
+    Args:
+        events: Queue of (event, payload) tuples from the analysis job, ending with
+            ("finished", output HTML)
+        
+    Yields:
+        Server-sent event strings: "details" with the results page for the article so
+        far, "sentences" with each batch of analysed text and the running entity tallies,
+        "entities" with the top entities section, then "done". If the results
+        came from the cache or from an analysis that was already running, they are sent
+        whole as a "result" event instead. If the analysis fails, "analysis-error" is
+        sent before "done"
+    """
+    streamed = False
+    
+    while True:
+        try:
+            event, payload = events.get(timeout=STREAM_KEEPALIVE_SECONDS)
+        except queue.Empty:
+            # Keep the connection open while waiting, e.g. behind another analysis of the article
+            yield ": keep-alive\n\n"
+            continue
+        
+        if event != "finished":
+            streamed = True
+            yield format_server_sent_event(event, payload)
+            continue
+        
+        if payload.startswith("Error extracting article"):
+            yield format_server_sent_event("analysis-error", {"error": payload})
+        elif not streamed:
+            yield format_server_sent_event("result", {"html": payload})
+        yield format_server_sent_event("done", {})
+        return
+
+def format_server_sent_event(event, data):
+    """Format an event and its JSON data as a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def render_article_html(details, entities_html, highlighted_parts):
+    """
+    Render the results for an article as HTML
+    
+    Args:
+        details: Article details from the "details" event of iter_article_events
+        entities_html: HTML for the top entities section
+        highlighted_parts: Highlighted HTML of each batch of the article text, see iter_sentiment_batches
+        
+    Returns:
+        HTML string
+    """
+    return app.jinja_env.get_template("article.html").render(
+        details=details,
+        entities_html=entities_html,
+        highlighted_parts=highlighted_parts
+    )
+
+# Content hashes of the static files by name, see get_static_url
+_static_versions = {}
+
+def get_static_url(filename):
+    """
+    Return the URL of a static file, versioned by a hash of its contents so browsers
+    fetch it again when it changes rather than keeping a stale copy
+    
+    Args:
+        filename: Name of the file in the static folder
+    """
+    if filename not in _static_versions:
+        with open(os.path.join(app.static_folder, filename), "rb") as f:
+            _static_versions[filename] = hashlib.sha256(f.read()).hexdigest()[:12]
+    return url_for("static", filename=filename, v=_static_versions[filename])
+
+app.add_template_global(get_static_url)
+
+@app.after_request
+def compress_response(response):
+    """
+    Compress text responses with brotli (if it is installed) or gzip, whichever the
+    browser accepts, and add an ETag to GET responses so browsers revalidating a page
+    they already have, like a finished job's results, get an empty 304 response
+    """
+    if response.status_code != 200 or response.mimetype not in COMPRESS_MIMETYPES:
+        return response
+    
+    # Streamed responses are sent as they are, so each part reaches the browser straight away
+    if response.is_streamed and not response.direct_passthrough:
+        return response
+    
+    # Static files are sent straight from disk unless their body is read here
+    response.direct_passthrough = False
+    response.vary.add("Accept-Encoding")
+    
+    data = response.get_data()
+    if len(data) >= COMPRESS_MIN_BYTES and "Content-Encoding" not in response.headers:
+        encoding = None
+        if request.accept_encodings["br"]:
+            try:
+                import brotli
+                response.set_data(brotli.compress(data, quality=5))
+                encoding = "br"
+            except ImportError:
+                pass
+        if encoding is None and request.accept_encodings["gzip"]:
+            # Without a timestamp the output, and so the ETag, is the same every time
+            response.set_data(gzip.compress(data, compresslevel=6, mtime=0))
+            encoding = "gzip"
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    
+    # The ETag is of the body as sent, so each encoding of a page has its own
+    if request.method in ("GET", "HEAD"):
+        response.add_etag(overwrite=True)
+        response.make_conditional(request)
+    
+    return response
+
+@app.route("/")
+def index():
+    # The analysis itself runs as a job. The page streams its results from /stream,
+    # or polls /jobs/<id> if the browser can't stream them
+    url = request.args.get("url", "")
+    
+    return render_template("index.html", url=url)
+
+@app.route("/stream")
+def stream():
+    """Stream the analysis of an article as server-sent events"""
+    url = request.args.get("url", "").strip()
+    if not url:
+        return jsonify({"error": "No article URL given"}), 400
+    
+    # The analysis runs on the job worker pool like any other job, so it shares the
+    # result cache and the queue limit, and this request only passes its events on
+    events = queue.Queue()
+    job = submit_analysis_job(url, lambda event, data: events.put((event, get_stream_payload(event, data))))
+    if job is None:
+        return jsonify({"error": "Too many articles are being analysed, please try again shortly"}), 503
+    
+    return Response(
+        stream_with_context(iter_article_stream(events)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/summary")
+def summary():
+    """Queue a job summarising an article, for its summary section when it is opened, and return its id"""
+    url = request.args.get("url", "").strip()
+    if not url:
+        return jsonify({"error": "No article URL given"}), 400
+    
+    # The summary runs on the job worker pool like the analysis, the result is fetched from /jobs/<id>
+    job = submit_summary_job(url)
+    if job is None:
+        return jsonify({"error": "Too many articles are being analysed, please try again shortly"}), 503
+    
+    return jsonify({"id": job["id"], "status": job["status"], "status_url": f"/jobs/{job['id']}"}), 202
+
+@app.route("/analyse", methods=["POST"])
+def analyse():
+    """Queue an analysis job for an article URL and return its id"""
+    data = request.get_json(silent=True) or request.form
+    url = (data.get("url") or "").strip()
+    if not url:
+        return jsonify({"error": "No article URL given"}), 400
+    
+    job = submit_analysis_job(url)
+    if job is None:
+        return jsonify({"error": "Too many articles are being analysed, please try again shortly"}), 503
+    
+    return jsonify({"id": job["id"], "status": job["status"], "status_url": f"/jobs/{job['id']}"}), 202
+
+@app.route("/batch", methods=["POST"])
+def batch():
+    """Queue a batch analysis of several articles, comparing their entities, and return its job id"""
+    data = request.get_json(silent=True) or {}
+    urls = data.get("urls")
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        return jsonify({"error": "Expected a JSON body with a list of article URLs in \"urls\""}), 400
+    
+    # Drop blank and repeated links to the same article, keeping the order given
+    unique_urls = {}
+    for url in urls:
+        if url.strip():
+            unique_urls.setdefault(canonicalize_url(url), url.strip())
+    urls = list(unique_urls.values())
+    
+    if not urls:
+        return jsonify({"error": "No article URLs given"}), 400
+    if len(urls) > BATCH_MAX_URLS:
+        return jsonify({"error": f"At most {BATCH_MAX_URLS} articles can be analysed in one batch"}), 400
+    
+    # The downloads and analysis run on the job worker pool, the result is fetched from /jobs/<id>
+    job = submit_batch_job(urls)
+    if job is None:
+        return jsonify({"error": "Too many articles are being analysed, please try again shortly"}), 503
+    
+    return jsonify({"id": job["id"], "status": job["status"], "status_url": f"/jobs/{job['id']}"}), 202
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """Return the status, progress and, once finished, the result of an analysis or batch job"""
+    with _jobs_lock:
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown job"}), 404
+        
+        return jsonify({
+            "id": job["id"],
+            "url": job["url"],
+            "urls": job["urls"],
+            "status": job["status"],
+            "progress": dict(job["progress"]),
+            "result": job["result"],
+            "error": job["error"]
+        })
+
+@app.route("/_ah/warmup")
+def warmup():
+    """App Engine warmup request, preloads the models before traffic is routed to this instance"""
+    initialize_nltk()
+    load_templates()
+    load_models()
+    return "", 200
+
+@app.route("/metrics")
+def metrics():
+    """Expose this worker's article timing histograms and counters in the Prometheus text format, labelled with its process id"""
+    return Response(format_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/memory")
+def memory():
+    """Report the shared and unique memory of the gunicorn master and workers"""
+    return jsonify(get_memory_report())
+
+@app.route("/readiness")
+def readiness():
+    """Report whether this worker has its models loaded and can serve analysis requests"""
+    if models_ready():
+        return "ready", 200
+    return "loading", 503
+
+def read_bulk_inputs(source):
+    """
+    List the articles to process in a bulk run
+    
+    Args:
+        source: Path to a JSONL file with one article URL per line, either as a JSON
+            string or an object with a "url" field, or a directory of saved HTML pages
+        
+    Returns:
+        List of (id, url, html file path) tuples. URL articles have no file path, and
+        saved pages are identified by their path relative to the directory
+    """
+    if os.path.isdir(source):
+        inputs = []
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith((".html", ".htm")):
+                    path = os.path.join(root, name)
+                    inputs.append((os.path.relpath(path, source), None, path))
+        return sorted(inputs)
+    
+    inputs = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            url = entry if isinstance(entry, str) else entry["url"]
+            inputs.append((url, url, None))
+    return inputs
+
+def read_bulk_checkpoint(output_path):
+    """
+    Find the articles already written to a bulk run's output, so an interrupted run
+    can carry on where it stopped. A partly written last line is removed. Articles
+    whose line is marked to be retried (see process_bulk_item) don't count as processed,
+    so they are tried again and a new line is written for them
+    
+    Args:
+        output_path: Path of the JSONL output file
+        
+    Returns:
+        Set of the ids of articles already processed
+    """
+    if not os.path.exists(output_path):
+        return set()
+    
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        
+        # Drop anything after the last complete line
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            f.truncate(complete)
+    
+    done = set()
+    for line in data[:complete].splitlines():
+        try:
+            result = json.loads(line)
+            if not result.get("retry"):
+                done.add(result["id"])
+        except (ValueError, KeyError, AttributeError):
+            continue
+    return done
+
+def initialize_bulk_worker(torch_threads):
+    """Load the models once in each bulk worker process"""
+    # Split the CPU between the workers instead of each one using every core
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    
+    initialize_nltk()
+    load_models()
+
+def process_bulk_item(item, summaries=False):
+    """
+    Extract and analyse one article of a bulk run
+    
+    Args:
+        item: (id, url, html file path) tuple, see read_bulk_inputs
+        summaries: Whether to also summarise the article
+        
+    Returns:
+        Dictionary with the article's id, details, text, summary (if asked for), entity
+        sentiments, top entities report and the number of sentences the models failed on
+        (which fall back to neutral, as on the web page). If the article couldn't be
+        processed, it has an error message instead, and "retry" is true if the error was
+        in downloading it, which may work when the run is resumed
+    """
+    item_id, url, path = item
+    
+    try:
+        if path:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                article, details = fetch_article(f"file://{os.path.abspath(path)}", input_html=f.read())
+            details["url"] = article.canonical_link or details["url"]
+        else:
+            article, details = fetch_article(url)
+    except Exception as e:
+        print(f"Error in process_bulk_item: {str(e)}")  # For debugging
+        return {"id": item_id, "url": url, "error": f"Error extracting article: {str(e)}", "retry": not path}
+    
+    try:
+        text = article.text if article.text else ""
+        
+        # The sentences the models failed on are counted in the stats. The models fail the
+        # same way on the same text every time, so the article isn't retried
+        stats = new_article_stats()
+        entity_sentiments = get_entity_sentiments(text, stats=stats)
+        
+        result = {
+            "id": item_id,
+            **details,
+            "text": text,
+            "entities": entity_sentiments,
+            "top_entities": generate_top_entities_report(entity_sentiments),
+            "failed_sentences": stats["failed_sentences"],
+            "error": None
+        }
+        if summaries:
+            result["summary"] = summarise_article(article)
+        return result
+    
+    except Exception as e:
+        print(f"Error in process_bulk_item: {str(e)}")  # For debugging
+        return {"id": item_id, "url": url, "error": f"Error analysing article: {str(e)}", "retry": False}
+
+def run_bulk(source, output_path, workers=None, summaries=False):
+    """
+    Process many articles offline across a pool of worker processes, writing one JSON
+    result per line to the output file as each article finishes. Articles already in
+    the output are skipped, so rerunning an interrupted run resumes it and retries the
+    articles that couldn't be downloaded
+    
+    Args:
+        source: JSONL file of URLs or directory of saved HTML pages, see read_bulk_inputs
+        output_path: Path of the JSONL output file
+        workers: Number of worker processes, defaults to the number of CPUs
+        summaries: Whether to also summarise each article
+    """
+    workers = workers or os.cpu_count() or 1
+    
+    done = read_bulk_checkpoint(output_path)
+    pending = [item for item in read_bulk_inputs(source) if item[0] not in done]
+    print(f"{len(done)} articles already processed, {len(pending)} to go")
+    if not pending:
+        return
+    
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    started = time.monotonic()
+    
+    with open(output_path, "a", encoding="utf-8") as output, \
+            multiprocessing.Pool(workers, initializer=initialize_bulk_worker, initargs=(torch_threads,)) as pool:
+        for count, result in enumerate(pool.imap_unordered(partial(process_bulk_item, summaries=summaries), pending), 1):
+            output.write(json.dumps(result, default=str) + "\n")
+            output.flush()
+            
+            if count % 10 == 0 or count == len(pending):
+                print(f"Processed {count}/{len(pending)} articles in {time.monotonic() - started:.0f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the web app, or analyse articles in bulk")
+    subparsers = parser.add_subparsers(dest="command")
+    bulk_parser = subparsers.add_parser("bulk", help="Analyse a file of article URLs or a directory of saved HTML pages")
+    bulk_parser.add_argument("source", help="JSONL file of article URLs, or directory of saved HTML pages")
+    bulk_parser.add_argument("output", help="JSONL file to write results to, resumed if it already exists")
+    bulk_parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    bulk_parser.add_argument("--summaries", action="store_true", help="Also summarise each article")
+    subparsers.add_parser("profile-startup", help="Time the imports of the heavy libraries and the loading of the models")
+    memory_parser = subparsers.add_parser("memory", help="Report the shared and unique memory of gunicorn's master and workers")
+    memory_parser.add_argument("master_pid", type=int, help="Process id of the gunicorn master")
+    args = parser.parse_args()
+    
+    if args.command == "bulk":
+        run_bulk(args.source, args.output, args.workers, args.summaries)
+    elif args.command == "profile-startup":
+        profile_startup()
+    elif args.command == "memory":
+        print(json.dumps(get_memory_report(args.master_pid), indent=2))
+    else:
+        app.run(host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,276 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Handle form submission with loading animation
+    const form = document.getElementById('analysisForm');
+    if (form) {
+        form.addEventListener('submit', function(e) {
+            showLoader();
+        });
+    }
+
+    // Start analysing if URL is already in the form, streaming the results
+    // where the browser supports it
+    const url = document.getElementById('url').value;
+    if (url) {
+        if (window.EventSource) {
+            streamAnalysis(url);
+        } else {
+            startAnalysis(url);
+        }
+    }
+});
+
+// Show the results of the analysis part by part as the server sends them
+function streamAnalysis(url) {
+    showLoader();
+    const source = new EventSource('/stream?url=' + encodeURIComponent(url));
+    const results = document.getElementById('results');
+    let received = false;
+    for (const name of ['details', 'result', 'analysis-error']) {
+        source.addEventListener(name, function() { received = true; });
+    }
+
+    source.addEventListener('details', function(e) {
+        results.innerHTML = JSON.parse(e.data).html;
+        initResultControls();
+        results.classList.add('visible');
+    });
+
+    source.addEventListener('sentences', function(e) {
+        const data = JSON.parse(e.data);
+        appendText('articleContent', data.highlighted);
+
+        // Show how far through the article the analysis is
+        if (data.total) {
+            document.getElementById('progress').textContent =
+                'Analysed ' + data.processed + ' of ' + data.total + ' sentences';
+        }
+
+        // Show the running entity tallies until the top entities are ready
+        const tallies = document.getElementById('topEntities');
+        if (tallies) {
+            tallies.textContent = data.top_entities.length ? '🔍 ENTITIES SO FAR: ' + data.top_entities.map(function(entity) {
+                return entity.name + ' (' + entity.occurrences + ')';
+            }).join(', ') : '';
+        }
+    });
+
+    source.addEventListener('entities', function(e) {
+        const tallies = document.getElementById('topEntities');
+        if (tallies) {
+            tallies.innerHTML = JSON.parse(e.data).html;
+            initResultControls();
+        }
+    });
+
+    // The whole results at once, when the article was already analysed or being analysed
+    source.addEventListener('result', function(e) {
+        showResults(JSON.parse(e.data).html);
+    });
+
+    source.addEventListener('done', function() {
+        source.close();
+        hideLoader();
+    });
+
+    source.addEventListener('analysis-error', function(e) {
+        source.close();
+        showError(JSON.parse(e.data).error);
+    });
+
+    // Stop the browser reconnecting and starting the analysis again if the connection drops.
+    // If the stream was refused before it started, e.g. because too many articles are being
+    // analysed, start a job instead, which reports why
+    source.onerror = function() {
+        source.close();
+        if (received) {
+            hideLoader();
+        } else {
+            startAnalysis(url);
+        }
+    };
+}
+
+// Add highlighted text to a section
+function appendText(sectionId, highlightedHtml) {
+    const text = document.getElementById(sectionId).querySelector('.article-text');
+    const separator = text.innerHTML ? ' ' : '';
+    text.insertAdjacentHTML('beforeend', separator + highlightedHtml);
+}
+
+// Start an analysis job for the URL and poll it until the results are ready
+function startAnalysis(url) {
+    showLoader();
+    fetch('/analyse', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ url: url })
+    })
+        .then(function(response) {
+            return response.json().then(function(job) {
+                if (!response.ok) {
+                    throw new Error(job.error || 'Could not start the analysis');
+                }
+                pollJob(job.status_url);
+            });
+        })
+        .catch(function(error) {
+            showError(error.message);
+        });
+}
+
+function pollJob(statusUrl) {
+    fetch(statusUrl)
+        .then(function(response) {
+            return response.json();
+        })
+        .then(function(job) {
+            if (job.status === 'done') {
+                showResults(job.result);
+            } else if (job.status === 'error') {
+                showError(job.error);
+            } else {
+                // Show how far through the article the analysis is
+                if (job.progress.total) {
+                    document.getElementById('progress').textContent =
+                        'Analysed ' + job.progress.processed + ' of ' + job.progress.total + ' sentences';
+                }
+                setTimeout(function() { pollJob(statusUrl); }, 1000);
+            }
+        })
+        .catch(function(error) {
+            showError(error.message);
+        });
+}
+
+// Put the finished analysis on the page
+function showResults(resultHtml) {
+    hideLoader();
+    const results = document.getElementById('results');
+    results.innerHTML = resultHtml;
+    initResultControls();
+    setTimeout(function() {
+        results.classList.add('visible');
+    }, 300);
+}
+
+function showError(message) {
+    hideLoader();
+    const results = document.getElementById('results');
+    results.textContent = message;
+    results.classList.add('visible');
+}
+
+// Wire up the toggles inside the analysis results. Toggles that are already
+// wired up are skipped, so this can be called again as more results arrive
+function initResultControls() {
+    // Sentiment Toggle switch
+    const toggle = document.getElementById('sentimentToggle');
+    if (toggle && !toggle.dataset.bound) {
+        toggle.dataset.bound = 'true';
+        toggle.addEventListener('change', function() {
+            const legend = document.getElementById('sentiment-legend');
+
+            // Toggle legend opacity
+            legend.style.opacity = this.checked ? '1' : '0.3';
+
+            // Toggle the entity highlighting, the text itself is only on the page once
+            document.getElementById('results').classList.toggle('highlights-off', !this.checked);
+        });
+    }
+
+    // Toggles for the summary, article text and top entities sections
+    const sections = [
+        ['summaryToggle', 'summaryContent'],
+        ['articleToggle', 'articleContent'],
+        ['topEntitiesToggle', 'topEntitiesContent']
+    ];
+    for (const [toggleId, contentId] of sections) {
+        const sectionToggle = document.getElementById(toggleId);
+        const sectionContent = document.getElementById(contentId);
+        if (sectionToggle && sectionContent && !sectionToggle.dataset.bound) {
+            sectionToggle.dataset.bound = 'true';
+            sectionToggle.addEventListener('change', function() {
+                if (this.checked) {
+                    sectionContent.classList.add('active');
+                    if (sectionContent.dataset.summaryUrl) {
+                        loadSummary(sectionContent);
+                    }
+                } else {
+                    sectionContent.classList.remove('active');
+                }
+            });
+        }
+    }
+}
+
+// Ask for the summary the first time its section is opened, it isn't made with the rest
+// of the analysis. It is made by a job, polled until it is ready
+function loadSummary(section) {
+    const text = section.querySelector('.article-text');
+    const summaryUrl = section.dataset.summaryUrl;
+    delete section.dataset.summaryUrl;
+    text.textContent = 'Loading summary...';
+
+    function showSummaryError(message) {
+        text.textContent = message;
+        // Try again the next time the section is opened
+        section.dataset.summaryUrl = summaryUrl;
+    }
+
+    function pollSummary(statusUrl) {
+        fetch(statusUrl)
+            .then(function(response) {
+                return response.json();
+            })
+            .then(function(job) {
+                if (job.status === 'done') {
+                    text.innerHTML = job.result;
+                } else if (job.status === 'error' || !job.status) {
+                    showSummaryError(job.error || 'Could not load the summary');
+                } else {
+                    setTimeout(function() { pollSummary(statusUrl); }, 500);
+                }
+            })
+            .catch(function(error) {
+                showSummaryError(error.message);
+            });
+    }
+
+    fetch(summaryUrl)
+        .then(function(response) {
+            return response.json().then(function(job) {
+                if (!response.ok) {
+                    throw new Error(job.error || 'Could not load the summary');
+                }
+                pollSummary(job.status_url);
+            });
+        })
+        .catch(function(error) {
+            showSummaryError(error.message);
+        });
+}
+
+// Back to top button functionality
+window.onscroll = function() {
+    const mybutton = document.getElementById("backToTopBtn");
+    if (document.body.scrollTop > 20 || document.documentElement.scrollTop > 20) {
+        mybutton.style.display = "block";
+    } else {
+        mybutton.style.display = "none";
+    }
+};
+
+// Show loading indicator and hide results
+function showLoader() {
+    document.getElementById("loader").style.display = "block";
+    const results = document.getElementById("results");
+    if (results) {
+        results.classList.remove('visible');
+    }
+    return true;
+}
+
+function hideLoader() {
+    document.getElementById("loader").style.display = "none";
+    document.getElementById("progress").textContent = "";
+}